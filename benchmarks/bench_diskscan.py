@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+# Compare the DiskConsumers scan strategies on a synthetic tree. Run from the repository root:
+#
+#   python3 benchmarks/bench_diskscan.py                # builds and removes a 1M file tree under $TMPDIR
+#   python3 benchmarks/bench_diskscan.py --path ~/src   # times an existing directory instead
+#
+# Times are wall clock seconds and depend heavily on the page cache, so every strategy is run --repeat times and
+# the best run is reported. Run it on the platform you care about (APFS behaves very differently from ext4/tmpfs).
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from swiftbar import diskscan
+from typing import Callable, List
+import argparse
+import shutil
+import subprocess
+import tempfile
+import time
+
+def build_tree(root: str=None, files: int=1_000_000, top_level: int=200, per_dir: int=100) -> None:
+    """
+    Create files spread over top_level directories with two levels of subdirectories. One file in ten gets 4 KiB
+    of data so the sizes aren't all zero.
+    """
+    dirs = max(files // per_dir, 1)
+    per_top = max(dirs // top_level, 1)
+    fanout = max(int(per_top ** 0.5), 1)
+    created = 0
+    for d in range(dirs):
+        top, rest = divmod(d, per_top)
+        directory = os.path.join(root, f'top{top}', f'a{rest // fanout}', f'b{rest % fanout}')
+        os.makedirs(directory, exist_ok=True)
+        for f in range(min(per_dir, files - created)):
+            with open(os.path.join(directory, f'file{f}'), 'wb') as fh:
+                if f % 10 == 0:
+                    fh.write(b'x' * 4096)
+        created += per_dir
+        if created >= files:
+            break
+
+def find_du(path: str=None) -> None:
+    # The pre-diskscan implementation: one du per top level entry
+    subprocess.run(f'find "{path}" -mindepth 1 -maxdepth 1 -exec du -sk {{}} \\;', shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def best_of(repeat: int=3, function: Callable[[], None]=None, setup: Callable[[], None]=None) -> float:
+    times: List[float] = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the DiskConsumers scan strategies')
+    parser.add_argument('--path', help='Scan an existing directory instead of building a synthetic tree', required=False, default=None)
+    parser.add_argument('--files', help='Number of files in the synthetic tree', required=False, default=1_000_000, type=int)
+    parser.add_argument('--repeat', help='Runs per strategy', required=False, default=3, type=int)
+    parser.add_argument('--keep', help="Don't remove the synthetic tree", required=False, default=False, action='store_true')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench-diskscan-')
+    path = os.path.expanduser(args.path) if args.path else os.path.join(work_dir, 'tree')
+    index_file = os.path.join(work_dir, 'index.json')
+    try:
+        if not args.path:
+            start = time.perf_counter()
+            build_tree(path, files=args.files)
+            print(f'Built {args.files:,} files in {path} in {time.perf_counter() - start:.1f}s')
+
+        def remove_index() -> None:
+            if os.path.exists(index_file):
+                os.unlink(index_file)
+
+        # Warm the page cache so the first strategy isn't penalized
+        find_du(path)
+        results = [
+            ('find -exec du -sk (previous)', best_of(args.repeat, lambda: find_du(path))),
+            ('scan_tree, no index (walk)', best_of(args.repeat, lambda: diskscan.scan_tree(path))),
+            ('scan_tree, no index (use_du)', best_of(args.repeat, lambda: diskscan.scan_tree(path, use_du=True))),
+            ('scan_tree, cold index (walk + seed)', best_of(args.repeat, lambda: diskscan.scan_tree(path, index_file=index_file), setup=remove_index)),
+            ('scan_tree, cold index (use_du + seed)', best_of(args.repeat, lambda: diskscan.scan_tree(path, index_file=index_file, use_du=True), setup=remove_index)),
+        ]
+        diskscan.scan_tree(path, index_file=index_file)
+        results.append(('scan_tree, warm index (walk)', best_of(args.repeat, lambda: diskscan.scan_tree(path, index_file=index_file))))
+        for label, seconds in results:
+            print(f'{label:<44} {seconds:8.3f}s')
+    finally:
+        if args.keep and not args.path:
+            print(f'Kept {path}')
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+# Compare the streaming top-N selection in swiftbar.procinfo with the sort-everything approach the CpuPercent and
+# MemoryUsage plugins used before, on synthetic `ps -ax -o pid=,user=,rss=,%cpu=,comm=` output. Run from the
+# repository root:
+#
+#   python3 benchmarks/bench_ps.py
+#   python3 benchmarks/bench_ps.py --rows 50000 --idle 0.5
+#
+# Only the parsing and selection are timed, not ps itself. Times are the best of --repeat runs, in milliseconds.
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from swiftbar import procinfo
+from typing import Callable, List, NamedTuple
+import argparse
+import random
+import re
+import time
+
+class Consumer(NamedTuple):
+    Command: str
+    Value: float
+    Pid: int
+    User: str
+
+def make_lines(rows: int=10_000, idle: float=0.9, seed: int=0) -> List[str]:
+    """
+    Build rows of ps output where an idle fraction of the processes use no CPU, like on a real machine.
+    """
+    rng = random.Random(seed)
+    users = ['root', 'gdanko', '_windowserver', '_mdnsresponder', 'nobody']
+    lines: List[str] = []
+    for pid in range(1, rows + 1):
+        cpu = 0.0 if rng.random() < idle else round(rng.expovariate(1.0), 1)
+        rss = rng.randint(0, 2_000_000)
+        command = f'/Applications/Some App {pid % 97}.app/Contents/MacOS/Some App Helper (Renderer)'
+        lines.append(f'{pid:>6} {rng.choice(users):<16} {rss:>8} {cpu:>5.1f} {command}')
+    return lines
+
+def sort_all(lines: List[str]=None, n: int=30, key: str='CpuPercent') -> List[Consumer]:
+    # The previous implementation: a regex search and a tuple for every non-zero row, then a full sort
+    consumers: List[Consumer] = []
+    for line in lines:
+        match = re.search(r'^\s*(\d+)\s+(\S+)\s+(\d+)\s+(\d+(?:\.\d+)?)\s+(.*)$', line)
+        if match:
+            value = float(match.group(4)) if key == 'CpuPercent' else int(match.group(3)) * 1024
+            if value > 0:
+                consumers.append(Consumer(Command=match.group(5), Value=value, Pid=int(match.group(1)), User=match.group(2)))
+    return sorted(consumers, key=lambda item: float(item.Value), reverse=True)[:n]
+
+def streaming(lines: List[str]=None, n: int=30, key: str='CpuPercent') -> List[procinfo.ProcessRecord]:
+    return procinfo.top_n(procinfo.parse_ps_lines(lines, skip_zero=key), n=n, key=key)
+
+def best_of(repeat: int=20, function: Callable[[], object]=None) -> float:
+    times: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark top-N process selection')
+    parser.add_argument('--rows', help='Number of ps rows', required=False, default=10_000, type=int)
+    parser.add_argument('--idle', help='Fraction of processes using no CPU', required=False, default=0.9, type=float)
+    parser.add_argument('--top', help='Number of processes to select', required=False, default=30, type=int)
+    parser.add_argument('--repeat', help='Runs per strategy', required=False, default=20, type=int)
+    args = parser.parse_args()
+
+    lines = make_lines(args.rows, args.idle)
+    for key in ['CpuPercent', 'Rss']:
+        # Both must pick the same processes in the same order, apart from ties
+        expected = [consumer.Value for consumer in sort_all(lines, args.top, key)]
+        actual = [float(getattr(record, key)) for record in streaming(lines, args.top, key)]
+        assert actual == expected, f'{key}: the strategies disagree'
+
+        before = best_of(args.repeat, lambda: sort_all(lines, args.top, key))
+        after = best_of(args.repeat, lambda: streaming(lines, args.top, key))
+        print(f'{key:<10} {args.rows:,} rows, top {args.top}: sort all {before:7.2f}ms, streaming heap {after:7.2f}ms ({before / after:.1f}x)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+# Time rendering a large menu with swiftbar.plugin.Plugin, with and without the debug mode params validation.
+# Run from the repository root:
+#
+#   python3 benchmarks/bench_render.py
+#   python3 benchmarks/bench_render.py --items 5000 --repeat 3
+#
+# Each run renders --items menu items with a typical mix of params into the menu buffer and joins it, the way a
+# plugin run does, leaving out the Settings and Debugging menus. Times are the best of --repeat runs.
+
+import os
+import sys
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Plugin() creates its configuration and state directories under the home directory, so keep them out of the real one
+home = tempfile.mkdtemp(prefix='bench-render-')
+os.environ['HOME'] = home
+
+from swiftbar.plugin import Plugin
+from typing import Callable, List
+import argparse
+import shutil
+import time
+
+def render(plugin: Plugin=None, items: int=1000) -> str:
+    plugin.print_menu_title('Benchmark')
+    for i in range(items):
+        if i % 3 == 0:
+            plugin.print_menu_item(f'--:file_folder: {i:>8} - /Users/gdanko/Library/Caches/item{i}', cmd=['open', f'"/tmp/item{i}"'], emojize=True, symbolize=False, terminal=False, trim=False)
+        elif i % 3 == 1:
+            plugin.print_menu_item(f'Item {i}', color='#ff0000', refresh=True)
+        else:
+            plugin.print_menu_item(f'----Item {i}', cmd=['kill', '-SIGQUIT', str(i)], terminal=False, length=80)
+    menu = plugin.get_menu()
+    plugin.menu_lines = []
+    return menu
+
+def best_of(repeat: int=10, function: Callable[[], object]=None) -> float:
+    times: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark menu rendering')
+    parser.add_argument('--items', help='Number of menu items', required=False, default=1000, type=int)
+    parser.add_argument('--repeat', help='Runs per mode', required=False, default=10, type=int)
+    args = parser.parse_args()
+    # Plugin.setup() parses the command line with the plugin's own parser
+    sys.argv = sys.argv[:1]
+
+    try:
+        plugin = Plugin(disable_brew=True)
+        plugin.setup()
+        for debug in [False, True]:
+            plugin.debug = debug
+            milliseconds = best_of(args.repeat, lambda: render(plugin, args.items))
+            label = 'validated (debug)' if debug else 'fast path'
+            print(f'{label:<18} {args.items:,} items: {milliseconds:7.2f}ms ({milliseconds * 1000 / args.items:.1f}us per item)')
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
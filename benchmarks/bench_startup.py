@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+# Measure how long each plugin spends importing modules before main() runs, and fail when a plugin goes over its
+# budget. Run from the repository root:
+#
+#   python3 benchmarks/bench_startup.py                      # every plugin
+#   python3 benchmarks/bench_startup.py --plugin CpuPercent  # plugins whose file name contains CpuPercent
+#   python3 benchmarks/bench_startup.py --budget-scale 2     # on a slower machine
+#
+# Each plugin is loaded in a fresh `python -X importtime` process, under a module name other than __main__ so
+# main() doesn't run, and the cumulative times of the top level imports it triggers are added up. The
+# interpreter's own startup imports aren't counted. The best of --repeat runs is compared with the budget, and
+# the exit status is 1 if any plugin is over.
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typing import Dict, List
+import argparse
+import glob
+import subprocess
+
+# Milliseconds. The plugins that run every few seconds get the tightest budgets.
+DEFAULT_BUDGET = 40
+BUDGETS = {
+    'gdanko-finance-StockIndexes.15m.py': 90,
+    'gdanko-finance-StockQuotes.15m.py': 90,
+    'gdanko-other-Earthquakes.15m.py': 90,
+    'gdanko-weather-WeatherWAPI.10m.py': 90,
+}
+
+MARKER = '--- plugin imports start here'
+
+LOADER = f'''
+import importlib.util
+import sys
+spec = importlib.util.spec_from_file_location('plugin', sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+sys.stderr.write({MARKER!r} + '\\n')
+sys.stderr.flush()
+spec.loader.exec_module(module)
+'''
+
+def import_time(repo_root: str=None, plugin: str=None) -> float:
+    """
+    Load plugin once and return the milliseconds spent in the imports it triggered.
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', LOADER, plugin], cwd=repo_root, env=dict(os.environ, PYTHONPATH=repo_root), capture_output=True, encoding='utf-8')
+    if process.returncode != 0:
+        raise RuntimeError(f'{os.path.basename(plugin)} failed to load: {process.stderr.strip().splitlines()[-1]}')
+    # Lines look like "import time:       594 |       4749 |   swiftbar.plugin", with the name indented two
+    # spaces per nesting level, so a top level import has a single space after the last "|"
+    total = 0
+    started = False
+    for line in process.stderr.splitlines():
+        if line == MARKER:
+            started = True
+        elif started and line.startswith('import time:'):
+            _, cumulative, name = line.split('|')
+            if not name.startswith('  '):
+                total += int(cumulative)
+    return total / 1000
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Check the import time of every plugin against its budget')
+    parser.add_argument('--plugin', help='Only check plugins whose file name contains this string', required=False, default=None)
+    parser.add_argument('--repeat', help='Runs per plugin; the best one is used', required=False, default=5, type=int)
+    parser.add_argument('--budget-scale', help='Multiply every budget by this factor', required=False, default=1.0, type=float)
+    args = parser.parse_args()
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    plugins = sorted(glob.glob(os.path.join(repo_root, 'gdanko-*.py')))
+    if args.plugin:
+        plugins = [plugin for plugin in plugins if args.plugin in os.path.basename(plugin)]
+    if not plugins:
+        print('No plugins matched')
+        sys.exit(1)
+
+    over: List[str] = []
+    results: Dict[str, float] = {}
+    for plugin in plugins:
+        name = os.path.basename(plugin)
+        results[name] = min(import_time(repo_root, plugin) for _ in range(args.repeat))
+        budget = BUDGETS.get(name, DEFAULT_BUDGET) * args.budget_scale
+        status = 'ok' if results[name] <= budget else 'OVER'
+        if status == 'OVER':
+            over.append(name)
+        print(f'{name:<42} {results[name]:7.1f}ms / {budget:5.0f}ms  {status}')
+    if over:
+        print(f'{len(over)} plugin(s) over budget: {", ".join(over)}')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
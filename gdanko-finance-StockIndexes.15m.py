@@ -22,19 +22,18 @@ def main() -> None:
     plugin.setup()
 
     plugin_output = []
-    cookie, crumb = yfinance.get_cookie_and_crumb()
+    cookie, crumb = yfinance.get_cookie_and_crumb(cache_dir=plugin.state_dir)
     if cookie and crumb:
         symbol_map = {
             'Dow': '^DJI',
             'Nasdaq': '^IXIC',
             'S&P500': '^GSPC',
         }
+        quotes = yfinance.get_quotes(cookie=cookie, crumb=crumb, symbols=list(symbol_map.values()))
         for key, value in symbol_map.items():
-            index_data = yfinance.get_chart(cookie=cookie, crumb=crumb, ticker=value)
-            if index_data:
-                meta = index_data['chart']['result'][0]['meta']
-                price = meta['regularMarketPrice']
-                last = meta['chartPreviousClose']
+            if value in quotes:
+                price = quotes[value].Price
+                last = quotes[value].PreviousClose
 
                 if price > last:
                     arrow = u'\u2191'
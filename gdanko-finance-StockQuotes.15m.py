@@ -86,22 +86,30 @@ def main() -> None:
     plugin_output = []
     info_dict = {}
 
-    cookie, crumb = yfinance.get_cookie_and_crumb()
+    cookie, crumb = yfinance.get_cookie_and_crumb(cache_dir=plugin.state_dir)
     if cookie and crumb:
-        for symbol in re.split(r'\s*,\s*', plugin.configuration['SYMBOLS']):
-            company_data = yfinance.get_quote_summary(
+        symbols = re.split(r'\s*,\s*', plugin.configuration['SYMBOLS'])
+        quotes = yfinance.get_quotes(cookie=cookie, crumb=crumb, symbols=symbols)
+
+        # The quote summaries are only needed for the per-symbol menus
+        details_enabled = any(plugin.configuration[key] for key in ['COMPANY_INFO_ENABLED', 'COMPANY_OFFICERS_ENABLED', 'KEY_STATS_ENABLED', 'RATIOS_AND_PROFIABILITY_ENABLED', 'EVENTS_ENABLED'])
+        if quotes and details_enabled:
+            summaries = yfinance.get_quote_summaries(
                 cookie=cookie,
                 crumb=crumb,
-                modules=['financialData', 'quoteType', 'defaultKeyStatistics', 'assetProfile', 'summaryDetail'],
-                symbol=symbol,
+                modules=['financialData', 'defaultKeyStatistics', 'summaryDetail'],
+                static_modules=['quoteType', 'assetProfile'],
+                symbols=list(quotes.keys()),
+                cache_dir=plugin.state_dir,
             )
-            if company_data:
-                info_dict[symbol] = company_data
+            for symbol, company_data in zip(quotes.keys(), summaries):
+                if company_data:
+                    info_dict[symbol] = company_data
     
-        if len(info_dict) > 0:
-            for symbol, info in info_dict.items():
-                price = info['currentPrice']
-                last = info['previousClose']
+        if len(quotes) > 0:
+            for symbol, quote in quotes.items():
+                price = quote.Price
+                last = quote.PreviousClose
                 if price > last:
                     arrow = u'\u2191'
                     change_amount = f'+{util.pad_float((price - last))}'
@@ -113,10 +121,7 @@ def main() -> None:
                 plugin_output.append(f'{symbol} {util.pad_float(price)} {arrow} {change_amount} ({pct_change}%)')
 
             plugin.print_menu_title('; '.join(plugin_output))
-            for i in range (len(re.split(r'\s*,\s*', plugin.configuration['SYMBOLS']))):
-                symbol = re.split(r'\s*,\s*', plugin.configuration['SYMBOLS'])[i]
-                symbol_info = info_dict[symbol]
-
+            for symbol, symbol_info in info_dict.items():
                 company_info = OrderedDict()
                 if 'longName' in symbol_info:
                     company_info['Company'] = symbol_info['longName']
@@ -18,9 +18,9 @@
 # <swiftbar.environment>[INTERFACE=en0, VERBOSE=false]</swiftbar.environment>
 
 from collections import OrderedDict
-from swiftbar import util
+from swiftbar import sampler, util
 from swiftbar.plugin import Plugin
-from typing import NamedTuple, Union
+from typing import NamedTuple, Tuple, Union
 import re
 import time
 
@@ -65,6 +65,42 @@ def get_data(interface: str=None) -> Union[IoCounters, None]:
         print('oops! interface not found!')
         exit(1)
 
+def get_throughput(plugin: Plugin=None, interface: str=None) -> Tuple[IoCounters, IoCounters]:
+    # Use the sampler's ring buffer when it is running so we don't block for a second
+    sampled = sampler.get_io_counters_delta(interface=interface)
+    if sampled:
+        rates, totals = sampled
+        return IoCounters(interface=interface, **rates), IoCounters(interface=interface, **totals)
+
+    # Otherwise compute the rates against the counters saved by the previous run
+    second_sample = get_data(interface=interface)
+    sample_name = f'io_counters.{interface}'
+    last_sample = plugin.read_last_sample(sample_name)
+    plugin.write_last_sample(sample_name, list(second_sample[1:]))
+    if last_sample:
+        timestamp, previous_counters = last_sample
+        rates = sampler.calculate_io_counter_rates(previous_counters, list(second_sample[1:]), time.time() - timestamp)
+        # Counters going backwards means the interface was reset, so the sample can't be trusted
+        if all(rate >= 0 for rate in rates.values()):
+            return IoCounters(interface=interface, **rates), second_sample
+
+    # The previous sample is missing or stale, so take two samples one second apart
+    first_sample = second_sample
+    time.sleep(1)
+    second_sample = get_data(interface=interface)
+    network_throughput = IoCounters(
+        interface    = interface,
+        bytes_sent   = second_sample.bytes_sent - first_sample.bytes_sent,
+        bytes_recv   = second_sample.bytes_recv - first_sample.bytes_recv,
+        packets_sent = second_sample.packets_sent - first_sample.packets_sent,
+        packets_recv = second_sample.packets_recv - first_sample.packets_recv,
+        errin        = second_sample.errin - first_sample.errin,
+        errout       = second_sample.errout - first_sample.errout,
+        collisions   = second_sample.collisions - first_sample.collisions,
+    )
+    plugin.write_last_sample(sample_name, list(second_sample[1:]))
+    return network_throughput, second_sample
+
 def get_interface_data(interface: str=None) -> InterfaceData:
     flags, mac, inet, inet6 = None, None, None, None
     command = f'ifconfig {interface}'
@@ -84,10 +120,6 @@ def get_interface_data(interface: str=None) -> InterfaceData:
             inet6 = match[0]
     return InterfaceData(interface=interface, flags=flags, mac=mac, inet=inet, inet6=inet6)
 
-def get_public_ip() -> Union[str, None]:
-    _, stdout, _ = util.execute_command('curl https://ifconfig.io')
-    return stdout if stdout else None
- 
 def main() -> None:
     plugin = Plugin()
     plugin.defaults_dict['VERBOSE'] = {
@@ -113,21 +145,8 @@ def main() -> None:
     plugin.setup()
 
     interface_data = get_interface_data(plugin.configuration['INTERFACE'])
-    public_ip = get_public_ip()
-    first_sample = get_data(interface=plugin.configuration['INTERFACE'])
-    time.sleep(1)
-    second_sample = get_data(interface=plugin.configuration['INTERFACE'])
-
-    network_throughput = IoCounters(
-        interface    = plugin.configuration['INTERFACE'],
-        bytes_sent   = second_sample.bytes_sent - first_sample.bytes_sent,
-        bytes_recv   = second_sample.bytes_recv - first_sample.bytes_recv,
-        packets_sent = second_sample.packets_sent - first_sample.packets_sent,
-        packets_recv = second_sample.packets_recv - first_sample.packets_recv,
-        errin        = second_sample.errin - first_sample.errin,
-        errout       = second_sample.errout - first_sample.errout,
-        collisions   = second_sample.collisions - first_sample.collisions,
-    )
+    public_ip = util.get_public_ip(cache_dir=plugin.state_dir)
+    network_throughput, second_sample = get_throughput(plugin, plugin.configuration['INTERFACE'])
     plugin.print_menu_title(f'{network_throughput.interface} {util.process_bytes(network_throughput.bytes_recv)} RX / {util.process_bytes(network_throughput.bytes_sent)} TX')
     interface_output = OrderedDict()
     if interface_data.flags:
@@ -27,8 +27,8 @@ import datetime
 import re
 import time
 
-def get_quake_data(radius: int=0, magnitude: int=0, unit: str='m', limit: int=0) -> Tuple[Union[str, None], Dict[str, Any], Union[str, None]]:
-    geodata = util.geolocate_me()
+def get_quake_data(radius: int=0, magnitude: int=0, unit: str='m', limit: int=0, cache_dir: str=None) -> Tuple[Union[str, None], Dict[str, Any], Union[str, None]]:
+    geodata = util.geolocate_me(cache_dir=cache_dir)
     if not geodata:
         return None, {}, 'Failed to geolocate'
    
@@ -59,7 +59,9 @@ def get_quake_data(radius: int=0, magnitude: int=0, unit: str='m', limit: int=0)
         'offset': 1,
         'orderby': 'time',
     }
-    _, data, _ = request.swiftbar_request(host=host, path=path, query=query, return_type='json', encode_query=True)
+    # The time window changes every run, so key the last good response on everything else
+    cache_key = path + '?' + request.encode_query_string({k: v for k, v in query.items() if k not in ('starttime', 'endtime')})
+    _, data, _ = request.swiftbar_request(host=host, path=path, query=query, return_type='json', encode_query=True, cache_key=cache_key)
     return ', '.join(location) if len(location) >= 3 else None, data, None
 
 def main() -> None:
@@ -114,7 +116,8 @@ def main() -> None:
         radius=plugin.configuration['MAXIMUM_RADIUS'],
         magnitude=plugin.configuration['MINIMUM_MAGNITUDE'],
         unit=plugin.configuration['UNIT'],
-        limit=plugin.configuration['LIMIT']
+        limit=plugin.configuration['LIMIT'],
+        cache_dir=plugin.state_dir,
     )
     if quake_data:
         if 'features' in quake_data and type (quake_data['features']) == list:
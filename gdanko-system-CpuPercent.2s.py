@@ -20,11 +20,10 @@
 # <swiftbar.environment>[EXTENDED_DETAILS_ENABLED=true, CLICK_TO_KILL=false, KILL_SIGNAL=SIGQUIT, MAX_CONSUMERS=30]</swiftbar.environment>
 
 from collections import namedtuple
-from swiftbar import util
+from swiftbar import procinfo, sampler, util
 from swiftbar.plugin import Plugin
 from typing import Any, Dict, List, NamedTuple
-import pkg_resources
-import re
+import importlib.util
 
 class CpuTimes(NamedTuple):
     cpu: str
@@ -113,22 +112,31 @@ def combine_stats(cpu_time_stats: List=None, cpu_type: str=None) -> CpuTimes:
         user=(user / len(cpu_time_stats)),
     )
 
-def get_top_cpu_usage() -> List[CpuConsumer]:
+def get_individual_cpu_percent(plugin: Plugin=None) -> List[Any]:
+    from psutil import cpu_times, cpu_times_percent
+
+    # Use the sampler's ring buffer when it is running so we don't block for a second
+    individual_cpu_percent = sampler.get_cpu_percent()
+    if individual_cpu_percent is not None:
+        return individual_cpu_percent
+
+    # Otherwise compute the deltas against the CPU times saved by the previous run
+    current_times = [[getattr(cpu, field) for field in sampler.CPU_TIME_FIELDS] for cpu in cpu_times(percpu=True)]
+    last_sample = plugin.read_last_sample('cpu_times')
+    plugin.write_last_sample('cpu_times', current_times)
+    if last_sample:
+        _, previous_times = last_sample
+        if len(previous_times) == len(current_times):
+            return sampler.calculate_cpu_percent(previous_times, current_times)
+
+    # The previous sample is missing or stale, so take two samples one second apart
+    return cpu_times_percent(interval=1.0, percpu=True)
+
+def get_top_cpu_usage(limit: int=30) -> List[CpuConsumer]:
     cpu_info: List[CpuConsumer] = []
-    command = f'ps -axm -o %cpu,pid,user,comm | tail -n+2'
-    returncode, stdout, _ = util.execute_command(command)
-    if returncode == 0:
-        lines = stdout.strip().split('\n')
-        for line in lines:
-            match = re.search(r'^\s*(\d+\.\d+)\s+(\d+)\s+([A-Za-z0-9\-\.\_]+)\s+(.*)$', line)
-            if match:
-                cpu_usage = float(match.group(1))
-                pid = int(match.group(2))
-                user = match.group(3)
-                command_name = match.group(4)
-                if cpu_usage > 0.0:
-                    cpu_info.append(CpuConsumer(Command=command_name, CpuUsage=cpu_usage, Pid=pid, User=user))
-    return sorted(cpu_info, key=lambda item: float(item.CpuUsage), reverse=True)
+    for process in procinfo.top_processes(n=limit, key='CpuPercent'):
+        cpu_info.append(CpuConsumer(Command=process.Command, CpuUsage=process.CpuPercent, Pid=process.Pid, User=process.User))
+    return cpu_info
 
 def main() -> None:
     plugin = Plugin(disable_brew=True)
@@ -192,10 +200,9 @@ def main() -> None:
     #     del plugin.configuration['MAX_CONSUMERS'] 
 
     required = {'psutil'}
-    installed = {pkg.key for pkg in pkg_resources.working_set}
-    missing = required - installed
+    missing = {package for package in required if importlib.util.find_spec(package) is None}
     if len(missing) == 0:
-        from psutil import cpu_freq, cpu_times_percent
+        from psutil import cpu_freq
         command_length = 125
         cpu_type = util.get_sysctl('machdep.cpu.brand_string')
         cpu_family = get_cpu_family_strings().get(int(util.get_sysctl('hw.cpufamily')), int(util.get_sysctl('hw.cpufamily')))
@@ -203,7 +210,7 @@ def main() -> None:
         individual_cpu_pct = []
         combined_cpu_pct = []
 
-        individual_cpu_percent = cpu_times_percent(interval=1.0, percpu=True)
+        individual_cpu_percent = get_individual_cpu_percent(plugin)
 
         for i, cpu_instance in enumerate(individual_cpu_percent):
             individual_cpu_pct.append(CpuTimes(cpu=i, cpu_type=cpu_type, user=cpu_instance.user, system=cpu_instance.system, nice=cpu_instance.nice, idle=cpu_instance.idle))
@@ -223,11 +230,9 @@ def main() -> None:
                 plugin.print_menu_item(f'Core {str(cpu.cpu)}: user {cpu.user}%, sys {cpu.system}%, idle {cpu.idle}%')
 
         if 'TOP_CONSUMERS_ENABLED' in plugin.configuration and plugin.configuration['TOP_CONSUMERS_ENABLED']:
-            top_cpu_consumers = get_top_cpu_usage()
+            top_cpu_consumers = get_top_cpu_usage(plugin.configuration['MAX_CONSUMERS'])
             if len(top_cpu_consumers) > 0:
                 plugin.print_menu_separator()
-                if len(top_cpu_consumers) > plugin.configuration['MAX_CONSUMERS']:
-                    top_cpu_consumers = top_cpu_consumers[0:plugin.configuration['MAX_CONSUMERS']]
                 plugin.print_menu_item(
                     f'Top {len(top_cpu_consumers)} CPU Consumers',
                 )
@@ -8,41 +8,48 @@
 # <xbar.dependencies>python</xbar.dependencies>
 # <xbar.abouturl>https://github.com/gdanko/xbar-plugins/blob/main/gdanko-system-DiskConsumers.5m.py</xbar.abouturl>
 # <xbar.var>string(PATHS=/): A comma-delimited list of paths</xbar.var>
+# <xbar.var>string(ONE_FILESYSTEM_ENABLED=false): Don't cross into other volumes, e.g., mounted disk images and network shares</xbar.var>
+# <xbar.var>string(EXCLUDES=""): A comma-delimited list of glob patterns to skip, e.g., node_modules, .git, Library/Caches</xbar.var>
+# <xbar.var>string(DEPTH=2): How many levels of nested submenus to show</xbar.var>
+# <xbar.var>string(TOP_K=10): The number of largest children to show in each nested submenu</xbar.var>
+# <xbar.var>string(TIME_BUDGET=60): Stop scanning after this many seconds and show what was found so far</xbar.var>
+# <xbar.var>string(DU_ENABLED=false): Size the first scan of a path with du instead of the built-in walk</xbar.var>
 
 # <swiftbar.hideAbout>true</swiftbar.hideAbout>
 # <swiftbar.hideRunInTerminal>true</swiftbar.hideRunInTerminal>
 # <swiftbar.hideLastUpdated>true</swiftbar.hideLastUpdated>
 # <swiftbar.hideDisablePlugin>true</swiftbar.hideDisablePlugin>
 # <swiftbar.hideSwiftBar>false</swiftbar.hideSwiftBar>
-# <swiftbar.environment>[PATHS=/]</swiftbar.environment>
+# <swiftbar.environment>[PATHS=/, ONE_FILESYSTEM_ENABLED=false, EXCLUDES=, DEPTH=2, TOP_K=10, TIME_BUDGET=60, DU_ENABLED=false]</swiftbar.environment>
 
-from swiftbar import util
+from collections import namedtuple
+from swiftbar import diskscan, util
 from swiftbar.plugin import Plugin
-from typing import List, NamedTuple
 import os
 import re
 import time
 
-class DiskConsumer(NamedTuple):
-    Path: str
-    Bytes: int
-
-def get_consumers(path: str=None) -> List[DiskConsumer]:
-    consumers: List[DiskConsumer] = []
-    command = f'find {path} -depth 1 -exec du -sk {{}} \;'
-    _, stdout, _ = util.execute_command(command)
-    if stdout:
-        lines = stdout.strip().split('\n')
-        for line in lines:
-            match = re.search(r'^(\d+)\s+(.*)$', line)
-            if match:
-                bytes = int(match.group(1)) * 1024
-                path = match.group(2)
-                if os.path.basename(path) not in ['.', '..']:
-                    if bytes > 0:
-                        consumers.append(DiskConsumer(Path=path.strip(), Bytes=bytes))
-
-    return sorted(consumers, key=lambda item: item.Bytes, reverse=True)
+def render_children(plugin: Plugin=None, tree: diskscan.DiskTree=None, node: int=0, level: int=1, depth: int=1, top_k: int=None) -> None:
+    """
+    Print the children of a tree node, all of them at the top level and the top_k largest below it, recursing
+    into directories until depth levels are shown. Sizes of directories that weren't fully scanned are estimates
+    and are marked with a ">".
+    """
+    for child in tree.top_children(node, None if level == 1 else top_k):
+        consumer = tree.consumer(child)
+        padding_width = 12
+        icon = ':file_folder:' if consumer.IsDir else ':page_facing_up:'
+        size = ('>' if consumer.Estimated else '') + util.format_number(consumer.Bytes)
+        plugin.print_menu_item(
+            f'{"--" * level}{icon}' + f'{size.rjust(padding_width)} - {consumer.Path}',
+            cmd=['open', f'"{consumer.Path}"'],
+            emojize=True,
+            symbolize=False,
+            terminal=False,
+            trim=False,
+        )
+        if consumer.IsDir and level < depth:
+            render_children(plugin, tree, child, level + 1, depth, top_k)
 
 def main() -> None:
     start_time = util.unix_time_in_ms()
@@ -51,31 +58,94 @@ def main() -> None:
         'default_value': '~',
         'type': str,
     }
+    # Off by default, since on APFS the firmlinked /Users, /Applications and /Library live on the Data volume
+    plugin.defaults_dict['ONE_FILESYSTEM_ENABLED'] = {
+        'default_value': False,
+        'valid_values': [True, False],
+        'type': bool,
+        'setting_configuration': {
+            'default': False,
+            'flag': '--one-filesystem',
+            'title': 'one filesystem mode',
+        },
+    }
+    plugin.defaults_dict['EXCLUDES'] = {
+        'default_value': '',
+        'type': str,
+    }
+    plugin.defaults_dict['DEPTH'] = {
+        'default_value': 2,
+        'minmax': namedtuple('minmax', ['min', 'max'])(1, 5),
+        'type': int,
+        'setting_configuration': {
+            'default': None,
+            'flag': '--depth',
+            'increment': 1,
+            'title': 'Depth',
+        },
+    }
+    plugin.defaults_dict['TOP_K'] = {
+        'default_value': 10,
+        'minmax': namedtuple('minmax', ['min', 'max'])(5, 50),
+        'type': int,
+        'setting_configuration': {
+            'default': None,
+            'flag': '--top-k',
+            'increment': 5,
+            'title': 'Children per submenu',
+        },
+    }
+    plugin.defaults_dict['TIME_BUDGET'] = {
+        'default_value': 60,
+        'minmax': namedtuple('minmax', ['min', 'max'])(30, 240),
+        'type': int,
+        'setting_configuration': {
+            'default': None,
+            'flag': '--time-budget',
+            'increment': 30,
+            'title': 'Time budget (seconds)',
+        },
+    }
+    # Off by default; whether du beats the walk on a first scan depends on the filesystem, see benchmarks/bench_diskscan.py
+    plugin.defaults_dict['DU_ENABLED'] = {
+        'default_value': False,
+        'valid_values': [True, False],
+        'type': bool,
+        'setting_configuration': {
+            'default': False,
+            'flag': '--du',
+            'title': 'du for first scans',
+        },
+    }
     plugin.setup()
 
+    excludes = [pattern for pattern in re.split(r'\s*,\s*', plugin.configuration['EXCLUDES']) if pattern]
+
+    # All of the paths share the time budget, and unfinished scans resume from the index on the next run
+    scanned = expected = 0
     plugin.print_menu_title('Disk Consumption')
     if len(re.split(r'\s*,\s*', plugin.configuration['PATHS'])) > 0:
         for path in re.split(r'\s*,\s*', plugin.configuration['PATHS']):
             plugin.print_menu_item(os.path.expanduser(path))
-            total = 0
-            consumers = get_consumers(path)
-            for consumer in consumers:
-                total += consumer.Bytes
-                padding_width = 12
-                icon = ':file_folder:' if os.path.isdir(consumer.Path) else ':page_facing_up:'
-                plugin.print_menu_item(
-                    f'--{icon}' + f'{util.format_number(consumer.Bytes).rjust(padding_width)} - {consumer.Path}',
-                    cmd=['open', f'"{consumer.Path}"'],
-                    emojize=True,
-                    symbolize=False,
-                    terminal=False,
-                    trim=False,
-                )
-            plugin.print_menu_item(f'--Total: {util.format_number(total)}')
+            tree = diskscan.scan_tree(
+                path,
+                index_file=os.path.join(plugin.state_dir, plugin.plugin_basename) + '.index.json',
+                one_filesystem=plugin.configuration['ONE_FILESYSTEM_ENABLED'],
+                excludes=excludes,
+                time_budget=max(plugin.configuration['TIME_BUDGET'] - (util.unix_time_in_ms() - start_time) / 1000, 0.001),
+                use_du=plugin.configuration['DU_ENABLED'],
+            )
+            if tree:
+                scanned += tree.scanned
+                expected += tree.expected
+                render_children(plugin, tree, depth=plugin.configuration['DEPTH'], top_k=plugin.configuration['TOP_K'])
+            total = ('>' if tree and tree.estimated[0] else '') + util.format_number(tree.totals[0] if tree else 0)
+            plugin.print_menu_item(f'--Total: {total}')
     else:
         plugin.print_menu_item('N/A')
     end_time = util.unix_time_in_ms()
-    plugin.print_menu_item(f'Data fetched at {util.get_timestamp(int(time.time()))} in {end_time - start_time}ms')
+    completeness = min(scanned / expected, 1.0) if expected else 1.0
+    plugin.print_menu_item(f'Data fetched at {util.get_timestamp(int(time.time()))} in {end_time - start_time}ms ({completeness:.0%} complete)')
     plugin.render_footer()
 
 if __name__ == '__main__':
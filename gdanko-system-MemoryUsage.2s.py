@@ -21,7 +21,7 @@
 # <swiftbar.environment>[EXTENDED_DETAILS_ENABLED=true, CLICK_TO_KILL=false, KILL_SIGNAL=SIGQUIT, MAX_CONSUMERS=30]</swiftbar.environment, UNIT=auto>
 
 from collections import namedtuple, OrderedDict
-from swiftbar import util
+from swiftbar import procinfo, util
 from swiftbar.plugin import Plugin
 from typing import Any, Dict, List, NamedTuple, Tuple, Union
 import json
@@ -113,22 +113,11 @@ def virtual_memory() -> SystemMemory:
         speculative=memory_pressure_output['speculative'],
     )
 
-def get_top_memory_usage() -> List[MemoryConsumer]:
+def get_top_memory_usage(limit: int=30) -> List[MemoryConsumer]:
     memory_info: List[MemoryConsumer] = []
-    command = f'ps -axm -o rss,pid,user,comm | tail -n+2'
-    returncode, stdout, _ = util.execute_command(command)
-    if returncode ==  0:
-        lines = stdout.strip().split('\n')
-        for line in lines:
-            match = re.search(r'^(\d+)\s+(\d+)\s+([A-Za-z0-9\-\.\_]+)\s+(.*)$', line)
-            if match:
-                bytes = int(match.group(1)) * 1024
-                pid = match.group(2)
-                user = match.group(3)
-                command_name = match.group(4)
-                if bytes > 0:
-                    memory_info.append(MemoryConsumer(Command=command_name, Bytes=bytes, Pid=pid, User=user))
-    return sorted(memory_info, key=lambda item: item.Bytes, reverse=True)
+    for process in procinfo.top_processes(n=limit, key='Rss'):
+        memory_info.append(MemoryConsumer(Command=process.Command, Bytes=process.Rss, Pid=process.Pid, User=process.User))
+    return memory_info
 
 def main() -> None:
     plugin = Plugin(disable_brew=True)
@@ -222,11 +211,9 @@ def main() -> None:
             plugin.print_ordered_dict(memory_output, justify='left')
 
         if 'TOP_CONSUMERS_ENABLED' in plugin.configuration and plugin.configuration['TOP_CONSUMERS_ENABLED']:
-            top_memory_consumers = get_top_memory_usage()
+            top_memory_consumers = get_top_memory_usage(plugin.configuration['MAX_CONSUMERS'])
             if len(top_memory_consumers) > 0:
                 plugin.print_menu_separator()
-                if len(top_memory_consumers) > plugin.configuration['MAX_CONSUMERS']:
-                    top_memory_consumers = top_memory_consumers[0:plugin.configuration['MAX_CONSUMERS']]
                 plugin.print_menu_item(
                     f'Top {len(top_memory_consumers)} Memory Consumers',
                 )
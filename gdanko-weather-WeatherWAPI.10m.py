@@ -90,7 +90,7 @@ def main() -> None:
     if plugin.configuration['LOCATION']:
         location = plugin.configuration['LOCATION']
     else:
-        geodata = util.geolocate_me()
+        geodata = util.geolocate_me(cache_dir=plugin.state_dir)
         if geodata:
             location = f'{geodata.City}, {geodata.Region}, {geodata.Country}'
         else:
@@ -101,29 +101,32 @@ def main() -> None:
     if plugin.configuration['API_KEY'] == '':
         plugin.error_messages.append('Missing API key')
     else:
-        response, weather_data, err = request.swiftbar_request(
-            host='api.weatherapi.com',
-            path='/v1/current.json',
-            query={'key': plugin.configuration['API_KEY'], 'q': location, 'aqi': 'yes'},
-            return_type = 'json',
-            encode_query=True,
-        )
+        # The current conditions and the forecast are independent, so fetch them concurrently
+        (response, weather_data, err), (forecast_response, forecast_data, forecast_err) = request.run_requests([
+            {
+                'host': 'api.weatherapi.com',
+                'path': '/v1/current.json',
+                'query': {'key': plugin.configuration['API_KEY'], 'q': location, 'aqi': 'yes'},
+                'return_type': 'json',
+                'encode_query': True,
+            },
+            {
+                'host': 'api.weatherapi.com',
+                'path': '/v1/forecast.json',
+                'query': {'key': plugin.configuration['API_KEY'], 'q': location, 'days': 8, 'aqi': 'yes', 'alerts': 'yes'},
+                'return_type': 'json',
+                'encode_query': True,
+            },
+        ])
         if response.status != 200:
-            error_message = f'A non-200 {response.status} response code was received'
+            error_message = err or f'A non-200 {response.status} response code was received'
             if weather_data:
                 if 'error' in weather_data and 'message' in weather_data['error']:
                     error_message = weather_data['error']['message']
             plugin.error_messages.append(f'Failed to fetch weather data: {error_message}')
 
-        response, forecast_data, err = request.swiftbar_request(
-            host='api.weatherapi.com',
-            path='/v1/forecast.json',
-            query={'key': plugin.configuration['API_KEY'], 'q': location, 'days': 8, 'aqi': 'yes', 'alerts': 'yes'},
-            return_type = 'json',
-            encode_query=True,
-        )
-        if response.status != 200:
-            error_message = f'A non-200 {response.status} response code was received'
+        if forecast_response.status != 200:
+            error_message = forecast_err or f'A non-200 {forecast_response.status} response code was received'
             if forecast_data:
                 if 'error' in forecast_data and 'message' in forecast_data['error']:
                     error_message = forecast_data['error']['message']
@@ -0,0 +1,484 @@
+from array import array
+from swiftbar import storage
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple, Union
+import heapq
+import json
+import os
+import queue
+import re
+import time
+
+# Directory sizes are computed like `du`: the blocks allocated to every file, directory and symlink in the tree,
+# without following symlinks. The tree is walked in process, with each directory scanned by its own task on a
+# thread pool, so one huge child doesn't serialize the whole scan. With use_du, a scan that has nothing indexed
+# instead runs a single `du -k` over the top level directories and seeds the index described below from its
+# output; whether that is faster than the walk depends on the filesystem, so it is opt-in.
+#
+# With an index file, the allocated bytes of every directory's direct children and the names of its
+# subdirectories are remembered, keyed by device:inode and validated against the directory's mtime. A directory
+# whose mtime hasn't changed is not listed again; only its subdirectories are stat'ed so that they can be
+# validated in turn. A directory's mtime only changes when entries are added, removed or renamed, so files that
+# grow in place are picked up the next time their directory changes.
+#
+# Files with more than one hard link are kept apart from the per-directory totals and counted once per
+# (device, inode), however many times they are found.
+#
+# A scan produces a DiskTree of every directory under the root plus the TOP_FILES largest files of each
+# directory, so the largest consumers can be shown several levels deep without scanning again.
+#
+# A scan can be given a time budget. When it runs out, directories that haven't been scanned yet are counted with
+# the subtree total the index remembers from the last scan that finished them, or as empty if there is none, and
+# they and their ancestors are flagged as estimates. The directories that were scanned are merged into the index
+# rather than replacing it, so the index doubles as the cursor the next scan resumes from.
+
+DEFAULT_WORKERS = 8
+INDEX_VERSION = 5
+TOP_FILES = 10
+
+# Returns True for entries that should be neither counted nor descended into
+EntryFilter = Callable[[str, str, os.stat_result], bool]
+
+class DiskConsumer(NamedTuple):
+    Path: str
+    Bytes: int
+    IsDir: bool
+    Estimated: bool=False
+
+class DiskTree:
+    """
+    A size tree stored as parallel arrays indexed by node, with node 0 being the root. Every node's parent has a
+    lower index, so totals can be rolled up in a single backwards pass.
+    """
+    __slots__ = ('paths', 'parents', 'own_bytes', 'is_dir', 'estimated', 'totals', 'scanned', 'expected', '_children')
+
+    def __init__(self, root: str=None) -> None:
+        self.paths: List[str] = []
+        self.parents = array('q')
+        self.own_bytes = array('q')
+        self.is_dir = bytearray()
+        # Set for directories that weren't scanned before the time budget ran out, and for their ancestors
+        self.estimated = bytearray()
+        self.totals = array('q')
+        # The number of directories scanned, and the number believed to be under the root
+        self.scanned = 0
+        self.expected = 0
+        self._children: Union[List[List[int]], None] = None
+        self.add(root, -1, 0, True)
+
+    def add(self, path: str=None, parent: int=-1, own_bytes: int=0, is_dir: bool=False) -> int:
+        self.paths.append(path)
+        self.parents.append(parent)
+        self.own_bytes.append(own_bytes)
+        self.is_dir.append(is_dir)
+        self.estimated.append(False)
+        return len(self.paths) - 1
+
+    def roll_up(self) -> None:
+        """
+        Compute the total bytes of every subtree and flag the ancestors of estimated nodes.
+        """
+        totals = array('q', self.own_bytes)
+        estimated = self.estimated
+        for node in range(len(totals) - 1, 0, -1):
+            totals[self.parents[node]] += totals[node]
+            if estimated[node]:
+                estimated[self.parents[node]] = True
+        self.totals = totals
+        self._children = None
+
+    def children(self, node: int=0) -> List[int]:
+        if self._children is None:
+            self._children = [[] for _ in self.paths]
+            for child in range(1, len(self.paths)):
+                self._children[self.parents[child]].append(child)
+        return self._children[node]
+
+    def top_children(self, node: int=0, limit: int=None) -> List[int]:
+        """
+        Return the largest children of node with a non-zero size, largest first. All of them if limit is None.
+        """
+        children = [child for child in self.children(node) if self.totals[child] > 0]
+        if limit is None:
+            return sorted(children, key=lambda child: self.totals[child], reverse=True)
+        return heapq.nlargest(limit, children, key=lambda child: self.totals[child])
+
+    @property
+    def completeness(self) -> float:
+        """
+        The fraction of the directories under the root that were scanned, from 0.0 to 1.0.
+        """
+        return min(self.scanned / self.expected, 1.0) if self.expected else 1.0
+
+    def consumer(self, node: int=0) -> DiskConsumer:
+        return DiskConsumer(Path=self.paths[node], Bytes=self.totals[node], IsDir=bool(self.is_dir[node]), Estimated=bool(self.estimated[node]))
+
+def _allocated_bytes(stat: os.stat_result=None) -> int:
+    """
+    Return the space allocated to a file, which is what du reports, falling back to the apparent size.
+    """
+    blocks = getattr(stat, 'st_blocks', None)
+    return blocks * 512 if blocks is not None else stat.st_size
+
+def _index_key(stat: os.stat_result=None) -> str:
+    return f'{stat.st_dev}:{stat.st_ino}'
+
+def make_filter(root: str=None, one_filesystem: bool=False, excludes: List[str]=None) -> Union[EntryFilter, None]:
+    """
+    Build a filter for a scan of root. With one_filesystem, entries on a different device than root, e.g.,
+    mounted volumes and network shares, are skipped. Exclude patterns are shell globs; a pattern containing a
+    slash, e.g., Library/Caches, is matched against the path relative to root, and any other pattern, e.g.,
+    node_modules, against the entry name.
+    """
+    import fnmatch
+    name_patterns = [fnmatch.translate(pattern) for pattern in excludes or [] if pattern and '/' not in pattern]
+    path_patterns = [fnmatch.translate(pattern.strip('/')) for pattern in excludes or [] if pattern and '/' in pattern]
+    if not (one_filesystem or name_patterns or path_patterns):
+        return None
+    device = os.stat(root).st_dev if one_filesystem else None
+    name_re = re.compile('|'.join(name_patterns)) if name_patterns else None
+    path_re = re.compile('|'.join(path_patterns)) if path_patterns else None
+    prefix_length = len(os.path.join(root, ''))
+
+    def skip(path: str, name: str, stat: os.stat_result) -> bool:
+        if device is not None and stat.st_dev != device:
+            return True
+        if name_re and name_re.match(name):
+            return True
+        if path_re and path_re.match(path[prefix_length:]):
+            return True
+        return False
+    return skip
+
+def get_fingerprint(one_filesystem: bool=False, excludes: List[str]=None) -> str:
+    """
+    Describe the scan settings that affect the indexed totals, so an index built with other settings isn't reused.
+    """
+    return json.dumps({'one_filesystem': bool(one_filesystem), 'excludes': sorted(excludes or [])})
+
+def read_index(index_file: str=None, path: str=None, fingerprint: str=None) -> Tuple[Dict[str, Any], int]:
+    """
+    Return a tuple of the directory index for path stored in index_file and the number of directories the last
+    complete scan found, or an empty index and 0 if there is none or it was built with different scan settings.
+    """
+    index = storage.read_json(index_file)
+    if not index or index.get('version') != INDEX_VERSION:
+        return {}, 0
+    root = index['roots'].get(path)
+    if not root or root['fingerprint'] != fingerprint:
+        return {}, 0
+    return root['directories'], root['directory_count']
+
+def write_index(index_file: str=None, path: str=None, fingerprint: str=None, directories: Dict[str, Any]=None, directory_count: int=0) -> None:
+    """
+    Replace the directory index for path in index_file, keeping the indexes of other paths.
+    """
+    try:
+        with storage.locked(index_file):
+            index = storage.read_json(index_file)
+            if not index or index.get('version') != INDEX_VERSION:
+                index = {'version': INDEX_VERSION, 'roots': {}}
+            index['roots'][path] = {'fingerprint': fingerprint, 'directories': directories, 'directory_count': directory_count}
+            storage.write_json(index_file, index)
+    except OSError:
+        pass
+
+def _scan_directory(path: str=None, stat: os.stat_result=None, index: Dict[str, Any]=None, new_index: Dict[str, Any]=None, skip: EntryFilter=None) -> Tuple[int, List[Tuple[str, int]], List[Tuple[str, os.stat_result]], List[Tuple[str, int]]]:
+    """
+    Return a tuple of
+    * the bytes allocated to the files directly in path, except the ones in the next two lists
+    * (device:inode, bytes) tuples for the files that are hard linked elsewhere
+    * (path, stat) tuples for its subdirectories, whose own blocks aren't part of the bytes
+    * (name, bytes) tuples for its TOP_FILES largest files
+    If index has an entry for the directory with its current mtime, the entry is reused. Every directory visited is
+    recorded in new_index.
+    """
+    key = _index_key(stat)
+    cached = index.get(key) if index is not None else None
+    if cached and cached['mtime'] == stat.st_mtime_ns:
+        subdirs: List[Tuple[str, os.stat_result]] = []
+        for name in cached['subdirs']:
+            subdir = os.path.join(path, name)
+            try:
+                subdir_stat = os.stat(subdir, follow_symlinks=False)
+            except OSError:
+                # The directory changed within its mtime granularity, so list it again
+                break
+            # Something may have been mounted on the subdirectory since it was indexed
+            if not (skip and skip(subdir, name, subdir_stat)):
+                subdirs.append((subdir, subdir_stat))
+        else:
+            if new_index is not None:
+                new_index[key] = cached
+            return cached['bytes'], [tuple(link) for link in cached['links']], subdirs, [tuple(file) for file in cached['files']]
+
+    # DirEntry.is_dir() uses the file type returned by the directory listing, and DirEntry.stat() is called
+    # once per entry. Entries that vanish or can't be read are skipped.
+    blocks = 0
+    links: List[Tuple[str, int]] = []
+    subdirs = []
+    names: List[str] = []
+    files: List[Tuple[int, str]] = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    entry_stat = entry.stat(follow_symlinks=False)
+                    if skip and skip(entry.path, entry.name, entry_stat):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append((entry.path, entry_stat))
+                        names.append(entry.name)
+                    elif entry_stat.st_nlink > 1:
+                        links.append((_index_key(entry_stat), entry_stat.st_blocks * 512))
+                    else:
+                        # This is the hot loop, so count blocks inline rather than calling _allocated_bytes()
+                        blocks += entry_stat.st_blocks
+                        files.append((entry_stat.st_blocks, entry.name))
+                except OSError:
+                    continue
+    except OSError:
+        # Don't remember directories we couldn't read
+        return blocks * 512, links, subdirs, []
+    top_files = [(name, file_blocks * 512) for file_blocks, name in heapq.nlargest(TOP_FILES, files) if file_blocks]
+    own_bytes = blocks * 512 - sum(file_bytes for _, file_bytes in top_files)
+    if new_index is not None:
+        new_index[key] = {'mtime': stat.st_mtime_ns, 'bytes': own_bytes, 'links': links, 'subdirs': names, 'files': top_files}
+    return own_bytes, links, subdirs, top_files
+
+def _add_link(link_owners: Dict[str, Tuple[str, int, int]]=None, link: str=None, node: int=0, path: str=None, size: int=0) -> None:
+    if link not in link_owners or path < link_owners[link][0]:
+        link_owners[link] = (path, node, size)
+
+def _size_with_du(tree: DiskTree=None, top_level_dirs: List[Tuple[str, os.stat_result, int]]=None, one_filesystem: bool=False, deadline: float=None, new_index: Dict[str, Any]=None, visited: List[Tuple[str, int]]=None) -> Union[int, None]:
+    """
+    Size the top level directories with a single du process and add every directory below them to tree. Return
+    the number of directories left unfinished, or None if du couldn't be run. du prints each directory once its
+    subtree is done, children first, so if it is killed at the deadline the directories it printed are still
+    exact. If new_index is set, it is seeded with them, without their largest files, which aren't known, and
+    their (device:inode, node) tuples are added to visited.
+    """
+    import subprocess
+    import threading
+    # du counts a hard linked file for the first directory it finds it in, so pass them in the order the walk uses
+    command = ['du', '-k'] + (['-x'] if one_filesystem else []) + sorted(directory for directory, _, _ in top_level_dirs)
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError:
+        return None
+    timer = threading.Timer(max(deadline - time.monotonic(), 0), process.kill) if deadline is not None else None
+    if timer:
+        timer.start()
+    try:
+        output = process.stdout.read()
+    finally:
+        if timer:
+            timer.cancel()
+        process.stdout.close()
+        process.wait()
+    if process.returncode < 0:
+        # Drop the line du was writing when it was killed
+        output = output[:output.rfind(b'\n') + 1]
+
+    nodes = {directory: node for directory, _, node in top_level_dirs}
+
+    def get_node(directory: str) -> Union[int, None]:
+        # Directories are printed after their children, so unfinished parents are added when first seen
+        if directory not in nodes:
+            parent_dir = os.path.dirname(directory)
+            if len(parent_dir) >= len(directory):
+                return None
+            parent = get_node(parent_dir)
+            if parent is None:
+                return None
+            nodes[directory] = tree.add(directory, parent, 0, True)
+        return nodes[directory]
+
+    # In reverse, every finished directory comes before its children, so each child's total can be taken off
+    # its parent's to leave the bytes of the parent's own files
+    finished: Dict[int, List[str]] = {}
+    for line in reversed(output.splitlines()):
+        size, _, directory = line.partition(b'\t')
+        try:
+            size = int(size) * 1024
+        except ValueError:
+            continue
+        directory = os.fsdecode(directory)
+        node = get_node(directory)
+        if node is None:
+            continue
+        tree.own_bytes[node] = size
+        finished[node] = []
+        parent = tree.parents[node]
+        if parent in finished:
+            tree.own_bytes[parent] -= size
+            finished[parent].append(os.path.basename(directory))
+
+    pending = 0
+    for node in nodes.values():
+        if node not in finished:
+            tree.estimated[node] = True
+            pending += 1
+    tree.scanned += len(finished)
+    # The directories du hadn't reached are unknown, so extrapolate from the top level directories it finished
+    finished_top_level = sum(1 for _, _, node in top_level_dirs if node in finished)
+    if pending and finished_top_level:
+        pending = max(pending, round(len(finished) * (len(top_level_dirs) - finished_top_level) / finished_top_level))
+
+    if new_index is not None:
+        for node, subdirs in finished.items():
+            try:
+                stat = os.stat(tree.paths[node], follow_symlinks=False)
+            except OSError:
+                continue
+            own_bytes = max(tree.own_bytes[node] - _allocated_bytes(stat), 0)
+            new_index[_index_key(stat)] = {'mtime': stat.st_mtime_ns, 'bytes': own_bytes, 'links': [], 'subdirs': subdirs, 'files': []}
+            visited.append((_index_key(stat), node))
+    return pending
+
+def _fill_from_index(tree: DiskTree=None, node: int=0, stat: os.stat_result=None, index: Dict[str, Any]=None) -> None:
+    """
+    Count a directory that won't be scanned with its indexed subtree total, if there is one, and flag it.
+    """
+    entry = index.get(_index_key(stat)) if index else None
+    if entry and 'total' in entry:
+        tree.own_bytes[node] = entry['total']
+    tree.estimated[node] = True
+
+def _walk(tree: DiskTree=None, top_level_dirs: List[Tuple[str, os.stat_result, int]]=None, link_owners: Dict[str, Tuple[str, int, int]]=None, index: Dict[str, Any]=None, new_index: Dict[str, Any]=None, skip: EntryFilter=None, max_workers: int=DEFAULT_WORKERS, deadline: float=None, visited: List[Tuple[str, int]]=None) -> int:
+    """
+    Scan the top level directories on a thread pool and add everything below them to tree. Return the number of
+    directories left unfinished at the deadline. The (device:inode, node) tuples of the scanned directories are
+    added to visited.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Every finished scan reports back here with its node, and its subdirectories are added to the tree and
+    # queued as new tasks until nothing is outstanding. Only this thread touches the tree. Once the deadline
+    # passes, queued scans are cancelled (they still report back) and no new ones are started.
+    results = queue.SimpleQueue()
+    expired = False
+    pending = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def submit(directory: str, stat: os.stat_result, node: int) -> None:
+            executor.submit(_scan_directory, directory, stat, index, new_index, skip).add_done_callback(lambda future: results.put((directory, stat, node, future)))
+
+        for directory, stat, node in top_level_dirs:
+            submit(directory, stat, node)
+        outstanding = len(top_level_dirs)
+        while outstanding:
+            try:
+                directory, stat, node, future = results.get(timeout=None if expired or deadline is None else max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                expired = True
+                executor.shutdown(wait=False, cancel_futures=True)
+                continue
+            # Results served from the index can arrive faster than the queue ever runs dry
+            if not expired and deadline is not None and time.monotonic() >= deadline:
+                expired = True
+                executor.shutdown(wait=False, cancel_futures=True)
+            outstanding -= 1
+            if future.cancelled():
+                _fill_from_index(tree, node, stat, index)
+                pending += 1
+                continue
+            own_bytes, links, subdirs, files = future.result()
+            tree.scanned += 1
+            visited.append((_index_key(stat), node))
+            tree.own_bytes[node] += own_bytes
+            for link, size in links:
+                _add_link(link_owners, link, node, directory, size)
+            for name, size in files:
+                tree.add(os.path.join(directory, name), node, size, False)
+            for subdir, subdir_stat in subdirs:
+                child = tree.add(subdir, node, _allocated_bytes(subdir_stat), True)
+                if expired:
+                    _fill_from_index(tree, child, subdir_stat, index)
+                    pending += 1
+                else:
+                    submit(subdir, subdir_stat, child)
+                    outstanding += 1
+    return pending
+
+def scan_tree(path: str=None, max_workers: int=DEFAULT_WORKERS, index_file: str=None, one_filesystem: bool=False, excludes: List[str]=None, time_budget: float=None, use_du: bool=False) -> Union[DiskTree, None]:
+    """
+    Scan path once and return a DiskTree of its directories and their largest files, or None if path can't be
+    read. If index_file is set, unchanged directories are served from the index there, which is rewritten with
+    what was visited. If time_budget is set, stop scanning after that many seconds and return a partial tree. If
+    use_du is set and nothing is indexed, size the tree with du rather than the walk. See make_filter() for
+    one_filesystem and excludes.
+    """
+    deadline = time.monotonic() + time_budget if time_budget else None
+    path = os.path.expanduser(path)
+    tree = DiskTree(path)
+    top_level_dirs: List[Tuple[str, os.stat_result, int]] = []
+    # Hard linked files are counted once, for the directory with the lowest path that links to them, so the
+    # totals don't depend on the order in which the threads find them
+    link_owners: Dict[str, Tuple[str, int, int]] = {}
+    try:
+        skip = make_filter(path, one_filesystem, excludes)
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    entry_stat = entry.stat(follow_symlinks=False)
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if skip and skip(entry.path, entry.name, entry_stat):
+                    continue
+                if is_dir:
+                    top_level_dirs.append((entry.path, entry_stat, tree.add(entry.path, 0, _allocated_bytes(entry_stat), True)))
+                elif entry_stat.st_nlink > 1:
+                    _add_link(link_owners, _index_key(entry_stat), tree.add(entry.path, 0, 0, False), entry.path, _allocated_bytes(entry_stat))
+                else:
+                    tree.add(entry.path, 0, _allocated_bytes(entry_stat), False)
+    except OSError:
+        return None
+
+    # Only the directories visited by this scan are written back, which drops the ones that no longer exist
+    fingerprint = get_fingerprint(one_filesystem, excludes)
+    index, directory_count = read_index(index_file, path, fingerprint) if index_file else (None, 0)
+    new_index = {} if index_file else None
+
+    # du can only size a tree from scratch and can't apply the exclude patterns, so anything else uses the walk
+    pending = None
+    visited: List[Tuple[str, int]] = []
+    if use_du and not index and not excludes and top_level_dirs:
+        pending = _size_with_du(tree, top_level_dirs, one_filesystem, deadline, new_index, visited)
+    if pending is None:
+        pending = _walk(tree, top_level_dirs, link_owners, index, new_index, skip, max_workers, deadline, visited)
+
+    for _, node, size in link_owners.values():
+        tree.own_bytes[node] += size
+    tree.roll_up()
+
+    # Remember the subtree total of every directory that was sized completely, for scans that run out of time
+    # before reaching it. An estimated directory keeps the total from the last scan that finished it.
+    if new_index is not None:
+        for key, node in visited:
+            entry = new_index.get(key)
+            if entry is None:
+                continue
+            if not tree.estimated[node]:
+                entry['total'] = tree.totals[node]
+            elif 'total' not in entry and index and 'total' in index.get(key, {}):
+                entry['total'] = index[key]['total']
+
+    # A partial scan can't tell which indexed directories are gone, so it only adds to the index. Until a scan
+    # finishes, the number of directories the last complete scan found is the best guess at how many there are;
+    # the size of the merged index isn't, since it grows as partial scans add to it.
+    if pending:
+        tree.expected = max(directory_count, tree.scanned + pending)
+    else:
+        tree.expected = directory_count = tree.scanned
+    if index_file:
+        if pending:
+            new_index = {**index, **new_index}
+        write_index(index_file, path, fingerprint, new_index, directory_count)
+    return tree
+
+def get_consumers(path: str=None, max_workers: int=DEFAULT_WORKERS, index_file: str=None, one_filesystem: bool=False, excludes: List[str]=None, time_budget: float=None) -> List[DiskConsumer]:
+    """
+    Return a DiskConsumer for every direct child of path with a non-zero size, largest first. See scan_tree().
+    """
+    tree = scan_tree(path, max_workers=max_workers, index_file=index_file, one_filesystem=one_filesystem, excludes=excludes, time_budget=time_budget)
+    return [tree.consumer(child) for child in tree.top_children(0)] if tree else []
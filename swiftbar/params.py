@@ -1,7 +1,23 @@
-from typing import get_args, get_origin, Any, Dict
+from types import MappingProxyType
+from typing import get_args, get_origin, Any, Dict, Mapping, Tuple
 import re
 
+# Keys like param1...n are always allowed because print_menu_item generates them from cmd
+_PARAM_KEY = re.compile(r'^param[\d+]')
+
+def compile_schema(schema: Dict[str, Any]=None) -> Mapping[str, Tuple[Any, type, Tuple]]:
+    """
+    Precompute the base type and type arguments for every key so type checks don't have to call
+    get_origin()/get_args() on every assignment. The result is read-only so it can be shared.
+    """
+    return MappingProxyType({
+        key: (expected_type, get_origin(expected_type) or expected_type, get_args(expected_type))
+        for key, expected_type in schema.items()
+    })
+
 class TypedDict:
+    __slots__ = ('_enforce_schema', '_enforce_typing', '_schema', '_data')
+
     def __init__(self, enforce_schema: bool=True, enforce_typing: bool=True, schema: Dict[str, Any]=None, **params) -> None:
         """
         Initialize with a schema where keys are the expected fields and
@@ -9,27 +25,45 @@ class TypedDict:
         """
         self._enforce_schema = enforce_schema
         self._enforce_typing = enforce_typing
-        self._schema = schema
+        self._schema = schema if isinstance(schema, MappingProxyType) else compile_schema(schema or {})
         self._data = {}
         for k, v in params.items():
             self.__setitem__(k, v)
 
+    @classmethod
+    def from_params(cls, params: Dict[str, Any]=None, validate: bool=True) -> 'TypedDict':
+        """
+        Build an instance from params, silently dropping keys that aren't in the schema. If validate is False
+        the values are trusted as-is, which skips the per-key type checks entirely.
+        """
+        instance = cls(enforce_typing=validate)
+        if validate:
+            for k, v in params.items():
+                try:
+                    instance[k] = v
+                except KeyError:
+                    pass
+        else:
+            schema = instance._schema
+            instance._data = {k: v for k, v in params.items() if k in schema or _PARAM_KEY.match(k)}
+        return instance
+
     def __setitem__(self, key: str=None, value: Any=None) -> None:
         """
         Validate the key and value type when setting an item.
         If the key is param1...n, we will allow it.
         """
-        if re.match(r'^param[\d+]', key):
+        if _PARAM_KEY.match(key):
             self._data[key] = value
             return
         if self._enforce_schema:
             if key not in self._schema:
                 raise KeyError(f'Key "{key}" is not allowed.')
         if self._enforce_typing:
-            expected_type = self._schema[key]
-            if not self._check_exact_type(value, expected_type):
+            expected_type, origin, expected_args = self._schema[key]
+            if not self._check_exact_type(value, origin, expected_args):
                 raise TypeError(f'Value for "{key}" must be of type {str(expected_type)}')
-            self._data[key] = value
+        self._data[key] = value
 
     def __getitem__(self, key: str=None) -> Any:
         """
@@ -49,13 +83,10 @@ class TypedDict:
         """
         return key in self._data
 
-    def _check_exact_type(self, value, expected_type) -> bool:
+    def _check_exact_type(self, value, origin, expected_args) -> bool:
         """
         Determine if the value sent is the exact type we want.
         """
-        origin = get_origin(expected_type) or expected_type  # Get the base type
-        expected_args = get_args(expected_type)  # Get expected type arguments
-
         # Ensure value is an instance of the base type (list, dict, etc.)
         if not isinstance(value, origin):
             return False
@@ -85,109 +116,121 @@ class TypedDict:
             raise KeyError(f'Key "{key}" does not exist in the data.')
         return self._data.pop(key)
 
+PARAMS_SCHEMA = compile_schema({
+    'ansi': bool,
+    'color': str,
+    'emojize': bool,
+    'font': str,
+    'length': int,
+    'md': bool,
+    'sfcolor': str,
+    'sfsize': int,
+    'size': int,
+    'symbolize': bool,
+    'trim': bool,
+
+    'alternate': bool,
+    'checked': bool,
+    'dropdown': bool,
+    'image': str,
+    'sfimage': str,
+    'templateImage': str,
+    'tooltip': str,
+
+    'bash': str,
+    'cmd': list,
+    'disabled': bool,
+    'href': str,
+    'key': str,
+    'refresh': bool,
+    'shell': str,
+    'shortcut': str,
+    'terminal': bool,
+})
+
+XBAR_SCHEMA = compile_schema({
+    'ansi': bool,
+    'color': str,
+    'emojize': bool,
+    'font': str,
+    'length': int,
+    'size': int,
+    'trim': bool,
+
+    'alternate': bool,
+    'dropdown': bool,
+    'image': str,
+    'templateImage': str,
+
+    'bash': str,
+    'cmd': list,
+    'disabled': bool,
+    'href': str,
+    'key': str,
+    'refresh': bool,
+    'shell': str,
+    'terminal': bool,
+})
+
+SWIFTBAR_SCHEMA = compile_schema({
+    'ansi': bool,
+    'color': str,
+    'emojize': bool,
+    'font': str,
+    'length': int,
+    'md': bool,
+    'sfcolor': str,
+    'sfsize': int,
+    'size': int,
+    'symbolize': bool,
+    'trim': bool,
+
+    'alternate': bool,
+    'checked': bool,
+    'dropdown': bool,
+    'image': str,
+    'sfimage': str,
+    'templateImage': str,
+    'tooltip': str,
+
+    'bash': str,
+    'cmd': list,
+    'href': str,
+    'refresh': bool,
+    'shell': str,
+    'shortcut': str,
+    'terminal': bool,
+})
+
 class Params(TypedDict):
+    __slots__ = ()
+
     def __init__(self, enforce_schema: bool=True, enforce_typing: bool=True, **params) -> None:
         super().__init__(
             enforce_schema = enforce_schema,
             enforce_typing = enforce_typing,
-            schema={
-                'ansi': bool,
-                'color': str,
-                'emojize': bool,
-                'font': str,
-                'length': int,
-                'md': bool,
-                'sfcolor': str,
-                'sfsize': int,
-                'size': int,
-                'symbolize': bool,
-                'trim': bool,
-
-                'alternate': bool,
-                'checked': bool,
-                'dropdown': bool,
-                'image': str,
-                'sfimage': str,
-                'templateImage': str,
-                'tooltip': str,
-
-                'bash': str,
-                'cmd': list,
-                'disabled': bool,
-                'href': str,
-                'key': str,
-                'refresh': bool,
-                'shell': str,
-                'shortcut': str,
-                'terminal': bool,
-            },
+            schema=PARAMS_SCHEMA,
             **params,
         )
 
 class ParamsXbar(TypedDict):
+    __slots__ = ()
+
     def __init__(self, enforce_schema: bool=True, enforce_typing: bool=True, **params) -> None:
         super().__init__(
             enforce_schema = enforce_schema,
             enforce_typing = enforce_typing,
-            schema={
-                'ansi': bool,
-                'color': str,
-                'emojize': bool,
-                'font': str,
-                'length': int,
-                'size': int,
-                'trim': bool,
-
-                'alternate': bool,
-                'dropdown': bool,
-                'image': str,
-                'templateImage': str,
-
-                'bash': str,
-                'cmd': list,
-                'disabled': bool,
-                'href': str,
-                'key': str,
-                'refresh': bool,
-                'shell': str,
-                'terminal': bool,
-            },
+            schema=XBAR_SCHEMA,
             **params,
         )
 
 class ParamsSwiftBar(TypedDict):
+    __slots__ = ()
+
     def __init__(self, enforce_schema: bool=True, enforce_typing: bool=True, **params) -> None:
-       super().__init__(
-           enforce_schema = enforce_schema,
-           enforce_typing = enforce_typing,
-           schema = {
-            'ansi': bool,
-            'color': str,
-            'emojize': bool,
-            'font': str,
-            'length': int,
-            'md': bool,
-            'sfcolor': str,
-            'sfsize': int,
-            'size': int,
-            'symbolize': bool,
-            'trim': bool,
-
-            'alternate': bool,
-            'checked': bool,
-            'dropdown': bool,
-            'image': str,
-            'sfimage': str,
-            'templateImage': str,
-            'tooltip': str,
-
-            'bash': str,
-            'cmd': list,
-            'href': str,
-            'refresh': bool,
-            'shell': str,
-            'shortcut': str,
-            'terminal': bool,
-        },
-        **params,
-    )
+        super().__init__(
+            enforce_schema = enforce_schema,
+            enforce_typing = enforce_typing,
+            schema=SWIFTBAR_SCHEMA,
+            **params,
+        )
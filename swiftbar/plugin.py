@@ -1,19 +1,35 @@
 from collections import OrderedDict
-from pathlib import Path
-from swiftbar import images, util
+from swiftbar import images, procinfo, storage, util
 from swiftbar.params import Params, ParamsXbar, ParamsSwiftBar
-from typing import Any, Dict, List, Union
-import argparse
+from typing import Any, Dict, List, Set, Tuple, Union
+import atexit
 import json
 import os
-import shutil
 import sys
 import time
 import typing
 
+INVOKER_CACHE_SIZE = 16
+SWIFTBAR_PATH = '/Applications/SwiftBar.app/Contents/MacOS/SwiftBar'
+XBAR_PATH = '/Applications/xbar.app/Contents/MacOS/xbar'
+
 class Writer(typing.Protocol):
     def write(self, _: str, /) -> int: ...
 
+# Plugins with buffered menu lines that haven't been emitted yet. A plugin that raises or calls exit() before
+# render_footer() still gets its partial menu out, from the atexit hook below or, under swiftbar.runner, right
+# after its main() returns.
+_pending_menus: Set['Plugin'] = set()
+
+def flush_pending_menus(out: Writer=None) -> None:
+    """
+    Emit the buffered menu of every plugin that hasn't emitted it yet.
+    """
+    for plugin in list(_pending_menus):
+        plugin.flush_menu(out=out)
+
+atexit.register(flush_pending_menus)
+
 class Plugin:
     def __init__(self, **kwargs) -> None:
         self.disable_brew = kwargs.get('disable_brew', False)
@@ -22,13 +38,16 @@ class Plugin:
 
         self._set_path()
 
-        self.config_dir = os.path.join(Path.home(), '.config', 'SwiftBar')
+        self.config_dir = os.path.join(os.path.expanduser('~'), '.config', 'SwiftBar')
         self.invoked_by = None
         self.invoked_by_full = None
 
         self._get_config_dir()
         self._create_config_dir()
 
+        self.state_dir = storage.STATE_DIR
+        self._create_state_dir()
+
         self.parser = None
         self.args = None
         self.defaults_dict = OrderedDict()
@@ -51,6 +70,7 @@ class Plugin:
         self.plugin_name = os.path.abspath(sys.argv[0])
         self.plugin_basename = os.path.basename(self.plugin_name)
         self.vars_file = os.path.join(self.config_dir, self.plugin_basename) + '.vars.json'
+        self.menu_lines: List[str] = []
 
     def _set_path(self):
         """
@@ -65,22 +85,57 @@ class Plugin:
                 else:
                     os.environ['PATH'] = '/bin:/sbin:/usr/bin:/usr/sbin'
 
+    def _get_invoker_cache_file(self) -> str:
+        """
+        Return the path of the per-user file that maps parent PIDs to the host app they belong to.
+        """
+        import tempfile
+        return os.path.join(tempfile.gettempdir(), f'swiftbar-plugins-invoker-{os.getuid()}.json')
+
+    def _get_invoker_command(self, ppid: int=0) -> Union[str, None]:
+        """
+        Determine the command of the process that invoked the plugin. The host app's environment variables are
+        checked first, then a per-ppid cache file, and the process table is only consulted as a last resort.
+        Only host app paths are cached, so other parents' command lines, which may contain secrets, never are.
+        """
+        if 'SWIFTBAR_VERSION' in os.environ or os.environ.get('SWIFTBAR') == '1':
+            return SWIFTBAR_PATH
+        if any(key.startswith('XBAR') for key in os.environ):
+            return XBAR_PATH
+
+        cache_file = self._get_invoker_cache_file()
+        cache = storage.read_json(cache_file)
+        if not isinstance(cache, dict):
+            cache = {}
+        # The file lives in a shared directory on some systems, so anything but a known host is ignored
+        if cache.get(str(ppid)) in (SWIFTBAR_PATH, XBAR_PATH):
+            return cache[str(ppid)]
+
+        command = procinfo.get_process_command(ppid)
+        if command in (SWIFTBAR_PATH, XBAR_PATH):
+            # Hosts rarely change, so only keep the most recent few parents
+            cache = {key: value for key, value in list(cache.items())[-(INVOKER_CACHE_SIZE - 1):] if value in (SWIFTBAR_PATH, XBAR_PATH)}
+            cache[str(ppid)] = command
+            try:
+                storage.write_json(cache_file, cache, permissions=0o600)
+            except OSError:
+                pass
+        return command
+
     def _get_config_dir(self) -> None:
         """
         Determine the location of the configuration directory based on self.invoked_by, gotten from the parent PID.
         """
         ppid = os.getppid()
         self.invoker_pid = ppid
-        returncode, stdout, stderr = util.execute_command(f'/bin/ps -o command -p {ppid} | tail -n+2')
-        if returncode != 0 or stderr:
-            pass
+        stdout = self._get_invoker_command(ppid)
         if stdout:
             self.invoked_by_full = stdout
             self.invoked_by = os.path.basename(self.invoked_by_full)
-            if stdout == '/Applications/xbar.app/Contents/MacOS/xbar':
+            if stdout == XBAR_PATH:
                 self.config_dir = os.path.dirname(os.path.abspath(sys.argv[0]))
-            elif stdout == '/Applications/SwiftBar.app/Contents/MacOS/SwiftBar':
-                self.config_dir = os.path.join(Path.home(), '.config', 'SwiftBar')
+            elif stdout == SWIFTBAR_PATH:
+                self.config_dir = os.path.join(os.path.expanduser('~'), '.config', 'SwiftBar')
 
     def _create_config_dir(self) -> None:
         """
@@ -92,6 +147,15 @@ class Plugin:
             except:
                 pass
 
+    def _create_state_dir(self) -> None:
+        """
+        Create the directory for runtime state, e.g., samples and caches, if it doesn't exist.
+        """
+        try:
+            os.makedirs(self.state_dir, exist_ok=True)
+        except OSError:
+            pass
+
     def _write_config(self, contents: dict=None) -> None:
         # Let's make sure this is not duplicated
         """
@@ -152,10 +216,40 @@ class Plugin:
         
         self.debug = self.configuration['DEBUG_ENABLED']
 
+    def _get_sample_file(self, name: str=None) -> str:
+        """
+        Return the path of the file used to store the named sample between invocations.
+        """
+        return os.path.join(self.state_dir, self.plugin_basename) + f'.{name}.sample.json'
+
+    def read_last_sample(self, name: str=None, max_age: float=10.0, min_age: float=0.5) -> Union[Tuple[float, Any], None]:
+        """
+        Return a tuple of the timestamp and data saved by the previous invocation. Return None if there is no
+        sample, if it is older than max_age seconds, or if it is younger than min_age seconds, since deltas
+        over a very short window are too noisy to be useful.
+        """
+        contents = storage.read_json(self._get_sample_file(name))
+        if not contents or 'timestamp' not in contents or 'data' not in contents:
+            return None
+        age = time.time() - contents['timestamp']
+        if age < min_age or age > max_age:
+            return None
+        return contents['timestamp'], contents['data']
+
+    def write_last_sample(self, name: str=None, data: Any=None) -> None:
+        """
+        Atomically save a timestamped sample for the next invocation.
+        """
+        try:
+            storage.write_json(self._get_sample_file(name), {'timestamp': time.time(), 'data': data})
+        except OSError:
+            pass
+
     def _generate_args(self) -> None:
         """
         Generate an argparser namespace from self.defaults_dict.
         """
+        import argparse
         self.parser = argparse.ArgumentParser()
         for name, data in self.defaults_dict.items():
             if 'setting_configuration' in data:
@@ -197,6 +291,7 @@ class Plugin:
         """
         Parse self.args and look for changes, then update the JSON with the new setting.
         """
+        import argparse
         for action in self.parser._actions:
             if type(action) != argparse._HelpAction:
                 if action.default != getattr(self.args, action.dest, None):
@@ -226,37 +321,59 @@ class Plugin:
     def _sanitize_params(self, **params: Params) -> Union[ParamsXbar, ParamsSwiftBar]:
         """
         Create a new params object based on the value of self.invoked_by. Both xbar and SwiftBar have some unique
-        parameters and this will allow the work to be handled behind the scenes.
+        parameters and this will allow the work to be handled behind the scenes. Value types are only validated
+        in debug mode; otherwise unknown keys are dropped and the values are passed through as-is.
         """
-        sanitized = ParamsXbar() if self.invoked_by == 'xbar' else ParamsSwiftBar()
-        for k, v in params.items():
-            try:
-                sanitized[k] = v
-            except KeyError as e:
-                pass
-        return sanitized
+        params_class = ParamsXbar if self.invoked_by == 'xbar' else ParamsSwiftBar
+        return params_class.from_params(params, validate=self.debug)
 
-    def _print_update_time(self, *, out: Writer = sys.stdout) -> None:
+    def _write_line(self, line: str=None, out: Writer=None) -> None:
+        """
+        Add a line to the menu buffer, or write it straight to out if a writer was given.
+        """
+        if out is None:
+            if not self.menu_lines:
+                _pending_menus.add(self)
+            self.menu_lines.append(line)
+        else:
+            out.write(f'{line}\n')
+
+    def get_menu(self) -> str:
+        """
+        Return the buffered menu as a string.
+        """
+        return ''.join(f'{line}\n' for line in self.menu_lines)
+
+    def flush_menu(self, *, out: Writer=None) -> None:
+        """
+        Emit the buffered menu with a single write() and clear the buffer.
+        """
+        _pending_menus.discard(self)
+        if self.menu_lines:
+            (out or sys.stdout).write(self.get_menu())
+            self.menu_lines = []
+
+    def _print_update_time(self, *, out: Writer=None) -> None:
         """
         Print the updated time in human format.
         """
-        self.print_menu_separator()
-        self.print_menu_item(f'Updated {util.get_timestamp(int(time.time()))}')
-        self.print_menu_separator()
+        self.print_menu_separator(out=out)
+        self.print_menu_item(f'Updated {util.get_timestamp(int(time.time()))}', out=out)
+        self.print_menu_separator(out=out)
 
-    def print_menu_title(self, text: str=None, display_update_time: bool=True, *, out: Writer=sys.stdout, **params: Params) -> None:
+    def print_menu_title(self, text: str=None, display_update_time: bool=True, *, out: Writer=None, **params: Params) -> None:
         """
         Print the plugin title in the menu bar.
         """
         params = self._sanitize_params(**params)
         params_str = ' '.join(f'{k}={v}' for k, v in params.items())
-        print(f'{text} | {params_str}', file=out)
+        self._write_line(f'{text} | {params_str}', out)
         if display_update_time:
-            self._print_update_time()
+            self._print_update_time(out=out)
         else:
-            self.print_menu_separator()
+            self.print_menu_separator(out=out)
 
-    def print_ordered_dict(self, data: OrderedDict, justify: str='right', delimiter: str = '', indent: int=0, *, out: Writer=sys.stdout, **params: Params) -> None:
+    def print_ordered_dict(self, data: OrderedDict, justify: str='right', delimiter: str = '', indent: int=0, *, out: Writer=None, **params: Params) -> None:
         """
         Render an instance of collections.OrderedDict().
         """
@@ -267,11 +384,11 @@ class Plugin:
         for k, v in data.items():
             params_str = ' '.join(f'{k}={v}' for k, v in params.items())
             if justify == 'left':
-                self.print_menu_item(f'{indent_str}{k.ljust(longest)} {delimiter} {v} | {params_str}', **params)
+                self.print_menu_item(f'{indent_str}{k.ljust(longest)} {delimiter} {v} | {params_str}', out=out, **params)
             elif justify == 'right':
-                self.print_menu_item(f'{indent_str}{k.rjust(longest)} {delimiter} {v} | {params_str}', **params)
+                self.print_menu_item(f'{indent_str}{k.rjust(longest)} {delimiter} {v} | {params_str}', out=out, **params)
 
-    def print_menu_item(self, text: str=None, *, out: Writer=sys.stdout, **params: Params) -> None:
+    def print_menu_item(self, text: str=None, *, out: Writer=None, **params: Params) -> None:
         """
         Generic wrapper to print all non-title menu items.
         """
@@ -294,13 +411,13 @@ class Plugin:
                 params.pop('cmd')
 
         params_str = ' '.join(f'{k}={v}' for k, v in params.items())
-        print(f'{text} | {params_str}', file=out)
+        self._write_line(f'{text} | {params_str}', out)
 
-    def print_menu_separator(self, *, out: Writer = sys.stdout) -> None:
+    def print_menu_separator(self, *, out: Writer=None) -> None:
         """
         Print a menu separator.
         """
-        print('---', file=out)
+        self._write_line('---', out)
 
     def _render_settings_menu(self):
         """
@@ -355,6 +472,7 @@ class Plugin:
         """
         Create a menu item to display plugin debug information.
         """
+        import shutil
         pv = sys.version_info
         os_version = util.get_macos_version()
         total_mem = util.get_sysctl('hw.memsize')
@@ -380,6 +498,7 @@ class Plugin:
         debug_data['Default font size'] = self.font_size
         debug_data['Configuration directory'] = self.config_dir
         debug_data['Variables file'] = self.vars_file
+        debug_data['State directory'] = self.state_dir
         self.print_ordered_dict(debug_data, justify='left', indent=2)
         self.print_menu_item('--Variables')
         variables = OrderedDict()
@@ -392,10 +511,14 @@ class Plugin:
             environment_variables[key] = os.environ.get(key)
         self.print_ordered_dict(environment_variables, justify='right', indent=4, delimiter = '=', length=125)
 
-    def render_footer(self):
+    def render_footer(self, *, out: Writer=None):
+        """
+        Render the Settings and Debugging menus and emit the whole buffered menu to out.
+        """
         self.print_menu_separator()
         if self.defaults_dict:
             self._render_settings_menu()
         if self.debug:
             self._render_debugging_menu()
         self.print_menu_item('Refresh', refresh=True)
+        self.flush_menu(out=out)
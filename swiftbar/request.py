@@ -1,6 +1,51 @@
-from typing import Any, Dict, Optional, Union
+from swiftbar import storage
+from typing import Any, Dict, List, Optional, Tuple, Union
 import json
 import http.client
+import os
+import threading
+import time
+import zlib
+
+# Idle keep-alive connections keyed by (scheme, host, port). Consecutive requests to the same host, e.g., one
+# quote summary per symbol, reuse a connection instead of paying for a new TCP and TLS handshake every time.
+MAX_IDLE_CONNECTIONS = 4
+_pool: Dict[Tuple[str, str, Union[int, None]], List[http.client.HTTPConnection]] = {}
+_pool_lock = threading.Lock()
+
+# Successful GET responses are kept here as one file per URL. They are served while younger than the request's
+# cache_ttl, if it has one, and as the last good response whenever the host is unreachable. The least recently
+# used entries are evicted once the directory grows past CACHE_MAX_BYTES.
+DEFAULT_CACHE_DIR = os.path.join(storage.STATE_DIR, 'http-cache')
+CACHE_MAX_BYTES = 16 * 1024 * 1024
+CACHE_SUFFIX = '.cache'
+
+# Connect and read timeout, in seconds, for a single request. Failed idempotent requests are retried up to
+# DEFAULT_RETRIES times with jittered exponential backoff. When there is a last good response to fall back on,
+# a request gets a single attempt of at most FALLBACK_TIMEOUT seconds instead.
+DEFAULT_TIMEOUT = 10
+DEFAULT_RETRIES = 2
+FALLBACK_TIMEOUT = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# After BREAKER_THRESHOLD consecutive failed attempts to reach a host, the host's circuit opens and requests to it fail
+# fast (or are served stale from the cache) for BREAKER_COOLDOWN seconds before a single trial request is let through.
+DEFAULT_STATE_DIR = storage.STATE_DIR
+BREAKER_FILE = 'circuit-breakers.json'
+BREAKER_THRESHOLD = 3
+BREAKER_COOLDOWN = 300
+
+# Default overall timeout, in seconds, for a batch of concurrent requests made with run_requests()
+DEFAULT_GATHER_TIMEOUT = 30
+
+# Responses are requested compressed and inflated READ_CHUNK_SIZE bytes at a time as they are read, so the
+# compressed body is never held in memory in full. The inflated body is.
+ACCEPT_ENCODING = 'gzip'
+READ_CHUNK_SIZE = 64 * 1024
+
+# Errors that mean the server closed an idle keep-alive connection before we reused it
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError, ConnectionAbortedError, BrokenPipeError)
 
 def get_useragent() -> str:
     return 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/39.0.2171.95 Safari/537.36'
@@ -31,37 +76,555 @@ def encode_query_string(query: Dict[str, str]=None) -> str:
         encoded_pairs.append(f"{encoded_key}={encoded_value}")
     return '&'.join(encoded_pairs)
 
-def swiftbar_request(host: str=None, path: str='/', method: Optional[str]='GET', headers: Optional[Dict[str, Any]]=None, query: Optional[Dict[str, Any]]=None, encode_query: bool=False, data: Optional[Dict[str, Any]]=None, return_type: str='text') -> Union[int, str, bytes, Dict, Any, None]:
+def _new_connection(key: Tuple[str, str, Union[int, None]]=None, timeout: float=DEFAULT_TIMEOUT) -> http.client.HTTPConnection:
+    scheme, host, port = key
+    if scheme == 'https':
+        return http.client.HTTPSConnection(host, port, timeout=timeout)
+    return http.client.HTTPConnection(host, port, timeout=timeout)
+
+def _get_connection(key: Tuple[str, str, Union[int, None]]=None, timeout: float=DEFAULT_TIMEOUT) -> Tuple[http.client.HTTPConnection, bool]:
     """
-    Handle HTTP basic requests.
+    Return a tuple of an idle pooled connection or a new one for key, and whether it was reused.
     """
-    # Add support for other methods
-    response = None
+    with _pool_lock:
+        idle = _pool.get(key)
+        conn = idle.pop() if idle else None
+    if conn is None:
+        return _new_connection(key, timeout), False
+    conn.timeout = timeout
+    if conn.sock:
+        conn.sock.settimeout(timeout)
+    return conn, True
+
+def _release_connection(key: Tuple[str, str, Union[int, None]]=None, conn: http.client.HTTPConnection=None) -> None:
+    """
+    Return a connection to the pool, closing it if the pool for its host is full.
+    """
+    with _pool_lock:
+        idle = _pool.setdefault(key, [])
+        if len(idle) < MAX_IDLE_CONNECTIONS:
+            idle.append(conn)
+            return
+    conn.close()
+
+def close_connections() -> None:
+    """
+    Close every idle pooled connection.
+    """
+    with _pool_lock:
+        connections = [conn for idle in _pool.values() for conn in idle]
+        _pool.clear()
+    for conn in connections:
+        conn.close()
+
+class Response:
+    """
+    A stand-in for http.client.HTTPResponse, returned for cached responses and by async_swiftbar_request().
+    """
+    def __init__(self, status: int=200, reason: str='OK', headers: List[Tuple[str, str]]=None, from_cache: bool=False) -> None:
+        self.status = status
+        self.reason = reason
+        self.headers = http.client.HTTPMessage()
+        for name, value in headers or []:
+            self.headers[name] = value
+        self.from_cache = from_cache
+        self.will_close = False
+
+    def getheader(self, name: str=None, default: Any=None) -> Any:
+        values = self.headers.get_all(name)
+        return ', '.join(values) if values else default
+
+    def getheaders(self) -> List[Tuple[str, str]]:
+        return list(self.headers.items())
+
+def _get_cache_file(cache_dir: str=None, key: Tuple[str, str, Union[int, None]]=None, path: str=None) -> str:
+    import hashlib
+    scheme, host, port = key
+    url = f'{scheme}://{host}{f":{port}" if port else ""}{path}'
+    return os.path.join(cache_dir, hashlib.sha256(url.encode()).hexdigest() + CACHE_SUFFIX)
+
+def _read_cache_entry(cache_file: str=None) -> Union[Tuple[Dict[str, Any], bytes], None]:
+    """
+    Return a tuple of the metadata and body of a cache entry. An entry is a JSON metadata line followed by the raw body.
+    """
+    try:
+        with open(cache_file, 'rb') as fh:
+            metadata = json.loads(fh.readline())
+            return metadata, fh.read()
+    except (OSError, ValueError):
+        return None
+
+def _write_cache_entry(cache_file: str=None, metadata: Dict[str, Any]=None, content: bytes=None) -> None:
+    """
+    Atomically write a cache entry, readable only by the user, and evict old entries if the cache is over its size
+    limit. Failures are ignored because the cache is only an optimization.
+    """
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        # Responses can carry personal data, e.g., the geolocation of this machine
+        storage.write_bytes(cache_file, json.dumps(metadata).encode() + b'\n' + content, permissions=0o600)
+        _evict_cache_entries(os.path.dirname(cache_file))
+    except OSError:
+        pass
+
+def _evict_cache_entries(cache_dir: str=None, max_bytes: int=CACHE_MAX_BYTES) -> None:
+    """
+    Remove the least recently used entries until the cache fits in max_bytes. Hits update an entry's mtime.
+    """
+    entries = []
+    total = 0
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(CACHE_SUFFIX):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+    if total <= max_bytes:
+        return
+    for _, size, path in sorted(entries):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        total -= size
+        if total <= max_bytes:
+            break
+
+def _cached_response(metadata: Dict[str, Any]=None) -> Response:
+    return Response(status=metadata['status'], reason=metadata['reason'], headers=metadata['headers'], from_cache=True)
+
+def _read_body(response: http.client.HTTPResponse=None) -> bytes:
+    """
+    Read a response body, inflating a gzip-encoded body chunk by chunk as it arrives.
+    """
+    if (response.getheader('Content-Encoding') or '').lower() != 'gzip':
+        return response.read()
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    chunks = []
+    while True:
+        chunk = response.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        chunks.append(decompressor.decompress(chunk))
+    chunks.append(decompressor.flush())
+    return b''.join(chunks)
+
+def _with_accept_encoding(headers: Dict[str, Any]=None) -> Dict[str, Any]:
+    if headers and any(name.lower() == 'accept-encoding' for name in headers):
+        return headers
+    return dict(headers or {}, **{'Accept-Encoding': ACCEPT_ENCODING})
+
+def _send(key: Tuple[str, str, Union[int, None]]=None, method: str='GET', path: str='/', headers: Dict[str, Any]=None, timeout: float=DEFAULT_TIMEOUT) -> Tuple[http.client.HTTPResponse, bytes]:
+    """
+    Send a request on a pooled connection and return the response and its body.
+    """
+    headers = _with_accept_encoding(headers)
+    conn, reused = _get_connection(key, timeout)
+    try:
+        try:
+            conn.request(method, path, headers=headers)
+            response = conn.getresponse()
+            content = _read_body(response)
+        except _STALE_CONNECTION_ERRORS:
+            if not reused:
+                raise
+            # The server dropped the idle connection, so retry once on a fresh one
+            conn.close()
+            conn = _new_connection(key, timeout)
+            conn.request(method, path, headers=headers)
+            response = conn.getresponse()
+            content = _read_body(response)
+    except:
+        conn.close()
+        raise
+    if response.will_close:
+        conn.close()
+    else:
+        _release_connection(key, conn)
+    return response, content
+
+def _send_with_retries(key: Tuple[str, str, Union[int, None]]=None, method: str='GET', path: str='/', headers: Dict[str, Any]=None, timeout: float=DEFAULT_TIMEOUT, retries: int=DEFAULT_RETRIES, breaker_file: str=None) -> Tuple[http.client.HTTPResponse, bytes]:
+    """
+    Send a request, retrying GET and HEAD requests that fail or get a retryable status with full-jitter
+    exponential backoff. Every attempt counts toward the host's circuit breaker in breaker_file, and retries stop
+    once it opens. The last error is raised, or the last response returned, once retries run out.
+    """
+    attempts = retries + 1 if method in ('GET', 'HEAD') else 1
+    for attempt in range(attempts):
+        try:
+            response, content = _send(key, method, path, headers, timeout)
+        except (OSError, http.client.HTTPException):
+            if not _record_attempt(breaker_file, key[1], False) or attempt == attempts - 1:
+                raise
+        else:
+            if not _record_attempt(breaker_file, key[1], response.status < 500) or response.status not in RETRY_STATUSES or attempt == attempts - 1:
+                return response, content
+        import random
+        time.sleep(random.uniform(0, RETRY_BACKOFF * 2 ** attempt))
+
+def _get_breaker_file(state_dir: str=None) -> str:
+    return os.path.join(state_dir or DEFAULT_STATE_DIR, BREAKER_FILE)
+
+def _circuit_is_open(breaker_file: str=None, host: str=None) -> bool:
+    """
+    Return True if the host has failed too often recently. Once the cooldown has passed the circuit is
+    half-open: requests go through, and the next failure opens it again.
+    """
+    state = (storage.read_json(breaker_file) or {}).get(host)
+    if not state or state['failures'] < BREAKER_THRESHOLD:
+        return False
+    return time.time() - state['opened_at'] < BREAKER_COOLDOWN
+
+def _record_result(breaker_file: str=None, host: str=None, success: bool=True) -> None:
+    """
+    Count consecutive failures per host. The state file is only rewritten when a host's state changes.
+    """
+    if success and host not in (storage.read_json(breaker_file) or {}):
+        return
+    try:
+        os.makedirs(os.path.dirname(breaker_file), exist_ok=True)
+        with storage.locked(breaker_file):
+            breakers = storage.read_json(breaker_file) or {}
+            if success:
+                if host not in breakers:
+                    return
+                del breakers[host]
+            else:
+                state = breakers.setdefault(host, {'failures': 0, 'opened_at': 0})
+                state['failures'] += 1
+                if state['failures'] >= BREAKER_THRESHOLD:
+                    state['opened_at'] = time.time()
+            storage.write_json(breaker_file, breakers)
+    except OSError:
+        pass
+
+def _record_attempt(breaker_file: str=None, host: str=None, success: bool=True) -> bool:
+    """
+    Record the result of one attempt to reach host and return whether it is still worth retrying.
+    """
+    if not breaker_file:
+        return True
+    _record_result(breaker_file, host, success)
+    return success or not _circuit_is_open(breaker_file, host)
 
+def _attempt_limits(cache_file: str=None, entry: Union[Tuple[Dict[str, Any], bytes], None]=None, timeout: float=DEFAULT_TIMEOUT, retries: int=DEFAULT_RETRIES) -> Tuple[float, int]:
+    """
+    Return the timeout and retries for a request. A host that doesn't answer quickly isn't worth waiting for when
+    there is a last good response to serve instead.
+    """
+    if cache_file and (entry or os.path.exists(cache_file)):
+        return min(timeout, FALLBACK_TIMEOUT), 0
+    return timeout, retries
+
+def _unavailable(cache_file: str=None, entry: Union[Tuple[Dict[str, Any], bytes], None]=None, return_type: str='text', error: Any=None) -> Tuple[Any, Any, Any]:
+    """
+    Serve the last good cached response if there is one, otherwise a synthetic 503 response with the error.
+    """
+    if entry is None and cache_file:
+        entry = _read_cache_entry(cache_file)
+    if entry:
+        metadata, content = entry
+        return _decode_content(_cached_response(metadata), content, return_type)
+    return Response(status=503, reason='Service Unavailable'), None, error
+
+def _lookup_cache(key: Tuple[str, str, Union[int, None]]=None, method: str='GET', path: str='/', headers: Dict[str, Any]=None, cache_ttl: float=None, cache_dir: str=None, stale_if_error: bool=True, cache_key: str=None) -> Tuple[Union[str, None], Union[Tuple[Dict[str, Any], bytes], None], Dict[str, Any], bool]:
+    """
+    Return a tuple of the cache file for a request, or None if it isn't cached, its entry if cache_ttl is set,
+    the headers to send, with validators added for a stale entry, and whether the entry is fresh. Without a
+    cache_ttl, the entry is only read if the request fails. The entry is named by cache_key if it is set,
+    otherwise by the path and query.
+    """
+    if method != 'GET' or not (cache_ttl or stale_if_error):
+        return None, None, headers, False
+    cache_file = _get_cache_file(cache_dir or DEFAULT_CACHE_DIR, key, cache_key or path)
+    if not cache_ttl:
+        return cache_file, None, headers, False
+    entry = _read_cache_entry(cache_file)
+    if not entry:
+        return cache_file, None, headers, False
+    metadata, _ = entry
+    if time.time() - metadata['timestamp'] < cache_ttl:
+        # Mark the entry as recently used for eviction
+        try:
+            os.utime(cache_file)
+        except OSError:
+            pass
+        return cache_file, entry, headers, True
+    headers = dict(headers or {})
+    if metadata.get('etag'):
+        headers['If-None-Match'] = metadata['etag']
+    if metadata.get('last_modified'):
+        headers['If-Modified-Since'] = metadata['last_modified']
+    return cache_file, entry, headers, False
+
+def _store_response(cache_file: str=None, entry: Union[Tuple[Dict[str, Any], bytes], None]=None, response: Any=None, content: bytes=None) -> Tuple[Any, bytes]:
+    """
+    Cache a successful response, or refresh the entry a 304 response revalidated and return it instead.
+    """
+    if response.status == 304 and entry:
+        metadata, content = entry
+        metadata['timestamp'] = time.time()
+        _write_cache_entry(cache_file, metadata, content)
+        return _cached_response(metadata), content
+    if response.status == 200:
+        _write_cache_entry(cache_file, {
+            'timestamp': time.time(),
+            'status': response.status,
+            'reason': response.reason,
+            # The body is stored inflated, so drop the headers that describe the encoded body
+            'headers': [(name, value) for name, value in response.getheaders() if name.lower() not in ('content-encoding', 'content-length')],
+            'etag': response.getheader('ETag'),
+            'last_modified': response.getheader('Last-Modified'),
+        }, content)
+    return response, content
+
+def _build_path(path: str='/', query: Optional[Dict[str, Any]]=None, encode_query: bool=False) -> str:
     if query:
         if encode_query:
             params_str = encode_query_string(query)
         else:
             params_str = '&'.join([f'{k}={v}' for k, v in query.items()])
         path = '?'.join([path, params_str])
+    return path
 
-    conn = http.client.HTTPSConnection(host)
-    if headers:
-        conn.request(method, path, headers=headers)
-    else:
-        conn.request(method, path)
-    response = conn.getresponse()
-    content = response.read()
-    
+def swiftbar_request(host: str=None, path: str='/', method: Optional[str]='GET', headers: Optional[Dict[str, Any]]=None, query: Optional[Dict[str, Any]]=None, encode_query: bool=False, data: Optional[Dict[str, Any]]=None, return_type: str='text', scheme: str='https', port: Optional[int]=None, cache_ttl: Optional[float]=None, cache_dir: Optional[str]=None, timeout: float=DEFAULT_TIMEOUT, retries: int=DEFAULT_RETRIES, state_dir: Optional[str]=None, stale_if_error: bool=True, cache_key: Optional[str]=None) -> Union[int, str, bytes, Dict, Any, None]:
+    """
+    Handle HTTP basic requests. Successful GET responses are cached in cache_dir. If cache_ttl is set, they are
+    served from there for cache_ttl seconds, after which they are revalidated with their ETag or Last-Modified header.
+
+    Requests time out after timeout seconds and GET requests are retried, unless there is a last good response
+    to fall back on, in which case a request gets one short attempt. Hosts that keep failing are skipped for a
+    while, using circuit breaker state kept in state_dir. Whenever a host is unreachable, the last good
+    response is served unless stale_if_error is False, otherwise a 503 Response with the error. A request whose
+    query changes every time, e.g., with a time window, should pass a stable cache_key to name its cache entry,
+    or it never finds its last good response.
+    """
+    # Add support for other methods
+    path = _build_path(path, query, encode_query)
+    key = (scheme, host, port)
+    cache_file, entry, headers, fresh = _lookup_cache(key, method, path, headers, cache_ttl, cache_dir, stale_if_error, cache_key)
+    if fresh:
+        return _decode_content(_cached_response(entry[0]), entry[1], return_type)
+
+    breaker_file = _get_breaker_file(state_dir)
+    if _circuit_is_open(breaker_file, host):
+        return _unavailable(cache_file, entry, return_type, ConnectionError(f'{host} is failing, not retrying for now'))
+    timeout, retries = _attempt_limits(cache_file, entry, timeout, retries)
+    try:
+        response, content = _send_with_retries(key, method, path, headers, timeout, retries, breaker_file)
+    except (OSError, http.client.HTTPException) as e:
+        return _unavailable(cache_file, entry, return_type, e)
+    if response.status >= 500 and cache_file:
+        stale = _unavailable(cache_file, entry, return_type)
+        if stale[0].from_cache:
+            return stale
+
+    if cache_file:
+        response, content = _store_response(cache_file, entry, response, content)
+    return _decode_content(response, content, return_type)
+
+def _decode_content(response: Any=None, content: bytes=None, return_type: str='text') -> Tuple[Any, Any, Union[Exception, None]]:
     if return_type == 'text':
         return response, content.decode(), None
     elif return_type == 'binary':
         return response, content, None
     elif return_type == 'json':
         try:
-            json_body = json.loads(content.decode())
+            # json.loads() accepts bytes and detects UTF-8/16/32 itself; it still decodes them to a str internally
+            json_body = json.loads(content)
             return response, json_body, None
         except Exception as e:
             return response, None, e
     else:
         raise ValueError('Invalid return_type. Choose "json", "text", or "binary".')
+
+async def _read_async_body(reader: Any=None, status: int=200, method: str='GET', headers: http.client.HTTPMessage=None) -> bytes:
+    """
+    Read a response body that is either chunked, sized by Content-Length, or delimited by the connection closing,
+    inflating a gzip-encoded body chunk by chunk as it arrives, like _read_body().
+    """
+    if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+        return b''
+    decompressor = None
+    if (headers.get('Content-Encoding') or '').lower() == 'gzip':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    chunks = []
+
+    async def read_exactly(size: int=0) -> None:
+        while size > 0:
+            chunk = await reader.readexactly(min(size, READ_CHUNK_SIZE))
+            chunks.append(decompressor.decompress(chunk) if decompressor else chunk)
+            size -= len(chunk)
+
+    if (headers.get('Transfer-Encoding') or '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0].strip(), 16)
+            if size == 0:
+                # Skip any trailers
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                break
+            await read_exactly(size)
+            await reader.readline()
+    elif headers.get('Content-Length') is not None:
+        await read_exactly(int(headers['Content-Length']))
+    else:
+        while True:
+            chunk = await reader.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            chunks.append(decompressor.decompress(chunk) if decompressor else chunk)
+    if decompressor:
+        chunks.append(decompressor.flush())
+        if not decompressor.eof:
+            raise EOFError('Compressed response body ended early')
+    return b''.join(chunks)
+
+def _async_request_errors() -> Tuple[type, ...]:
+    """
+    Return the errors that mean an async request failed. asyncio.TimeoutError isn't an OSError before Python 3.11,
+    and a truncated or malformed body raises EOFError (asyncio.IncompleteReadError) or ValueError.
+    """
+    import asyncio
+    return (OSError, EOFError, ValueError, http.client.HTTPException, asyncio.TimeoutError)
+
+async def _async_send(key: Tuple[str, str, Union[int, None]]=None, method: str='GET', path: str='/', headers: Dict[str, Any]=None) -> Tuple[Response, bytes]:
+    """
+    Send a request over a new asyncio stream connection and return the response and its inflated body.
+    """
+    import asyncio
+    scheme, host, port = key
+    default_port = 443 if scheme == 'https' else 80
+    if port is None:
+        port = default_port
+    # Like http.client, name the port only when it isn't the scheme's default and bracket IPv6 addresses
+    host_header = f'[{host}]' if ':' in host else host
+    if port != default_port:
+        host_header = f'{host_header}:{port}'
+    ssl_context = None
+    if scheme == 'https':
+        import ssl
+        ssl_context = ssl.create_default_context()
+
+    reader, writer = await asyncio.open_connection(host, port, ssl=ssl_context)
+    try:
+        request_headers = {'Host': host_header, 'Connection': 'close'}
+        request_headers.update(_with_accept_encoding(headers))
+        head = f'{method} {path} HTTP/1.1\r\n' + ''.join(f'{k}: {v}\r\n' for k, v in request_headers.items()) + '\r\n'
+        writer.write(head.encode('latin-1'))
+        await writer.drain()
+
+        status_line = (await reader.readline()).decode('latin-1').rstrip('\r\n')
+        parts = status_line.split(' ', 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+            raise http.client.BadStatusLine(status_line)
+        response_headers = []
+        while True:
+            line = (await reader.readline()).decode('latin-1').rstrip('\r\n')
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            response_headers.append((name.strip(), value.strip()))
+        response = Response(status=int(parts[1]), reason=parts[2] if len(parts) > 2 else '', headers=response_headers)
+        content = await _read_async_body(reader, response.status, method, response.headers)
+    except:
+        # Don't wait for a graceful TLS shutdown of a connection that failed or was cancelled by a timeout
+        writer.transport.abort()
+        raise
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except _async_request_errors():
+            pass
+    return response, content
+
+async def _async_send_with_retries(key: Tuple[str, str, Union[int, None]]=None, method: str='GET', path: str='/', headers: Dict[str, Any]=None, timeout: float=DEFAULT_TIMEOUT, retries: int=DEFAULT_RETRIES, breaker_file: str=None) -> Tuple[Response, bytes]:
+    """
+    The asyncio counterpart of _send_with_retries(), where timeout bounds each attempt as a whole.
+    """
+    import asyncio
+    import random
+    attempts = retries + 1 if method in ('GET', 'HEAD') else 1
+    for attempt in range(attempts):
+        try:
+            response, content = await asyncio.wait_for(_async_send(key, method, path, headers), timeout)
+        except _async_request_errors():
+            if not _record_attempt(breaker_file, key[1], False) or attempt == attempts - 1:
+                raise
+        else:
+            if not _record_attempt(breaker_file, key[1], response.status < 500) or response.status not in RETRY_STATUSES or attempt == attempts - 1:
+                return response, content
+        await asyncio.sleep(random.uniform(0, RETRY_BACKOFF * 2 ** attempt))
+
+async def async_swiftbar_request(host: str=None, path: str='/', method: Optional[str]='GET', headers: Optional[Dict[str, Any]]=None, query: Optional[Dict[str, Any]]=None, encode_query: bool=False, return_type: str='text', scheme: str='https', port: Optional[int]=None, cache_ttl: Optional[float]=None, cache_dir: Optional[str]=None, timeout: float=DEFAULT_TIMEOUT, retries: int=DEFAULT_RETRIES, state_dir: Optional[str]=None, stale_if_error: bool=True, cache_key: Optional[str]=None) -> Union[int, str, bytes, Dict, Any, None]:
+    """
+    The asyncio counterpart of swiftbar_request(), so independent requests can overlap. It speaks plain HTTP/1.1
+    over asyncio streams with one connection per request and returns the same (response, body, error) tuple,
+    where response is a Response. Caching, timeouts, retries and the circuit breaker work as they do there.
+    """
+    path = _build_path(path, query, encode_query)
+    key = (scheme, host, port)
+    cache_file, entry, headers, fresh = _lookup_cache(key, method, path, headers, cache_ttl, cache_dir, stale_if_error, cache_key)
+    if fresh:
+        return _decode_content(_cached_response(entry[0]), entry[1], return_type)
+
+    breaker_file = _get_breaker_file(state_dir)
+    if _circuit_is_open(breaker_file, host):
+        return _unavailable(cache_file, entry, return_type, ConnectionError(f'{host} is failing, not retrying for now'))
+    timeout, retries = _attempt_limits(cache_file, entry, timeout, retries)
+    try:
+        response, content = await _async_send_with_retries(key, method, path, headers, timeout, retries, breaker_file)
+    except _async_request_errors() as e:
+        return _unavailable(cache_file, entry, return_type, e)
+    if response.status >= 500 and cache_file:
+        stale = _unavailable(cache_file, entry, return_type)
+        if stale[0].from_cache:
+            return stale
+
+    if cache_file:
+        response, content = _store_response(cache_file, entry, response, content)
+    return _decode_content(response, content, return_type)
+
+def _last_good(request: Dict[str, Any]=None, error: Any=None) -> Tuple[Any, Any, Any]:
+    """
+    Return the last good response for a request given as async_swiftbar_request() keyword arguments.
+    """
+    cache_file = None
+    if request.get('method', 'GET') == 'GET' and request.get('stale_if_error', True):
+        key = (request.get('scheme', 'https'), request.get('host'), request.get('port'))
+        path = _build_path(request.get('path', '/'), request.get('query'), request.get('encode_query', False))
+        cache_file = _get_cache_file(request.get('cache_dir') or DEFAULT_CACHE_DIR, key, request.get('cache_key') or path)
+    return _unavailable(cache_file, None, request.get('return_type', 'text'), error)
+
+async def gather_requests(requests: List[Dict[str, Any]]=None, timeout: float=DEFAULT_GATHER_TIMEOUT) -> List[Tuple[Any, Any, Any]]:
+    """
+    Run async_swiftbar_request() once per dict of keyword arguments in requests, concurrently. Results are in the
+    order of requests. A request that is still running after timeout seconds, or fails unexpectedly, yields its
+    last good response if there is one, otherwise a 503 Response with the error.
+    """
+    import asyncio
+    tasks = [asyncio.ensure_future(async_swiftbar_request(**kwargs)) for kwargs in requests]
+    if not tasks:
+        return []
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    results = []
+    for kwargs, task in zip(requests, tasks):
+        if task in pending:
+            results.append(_last_good(kwargs, TimeoutError(f'Request timed out after {timeout} seconds')))
+        elif task.exception():
+            results.append(_last_good(kwargs, task.exception()))
+        else:
+            results.append(task.result())
+    return results
+
+def run_requests(requests: List[Dict[str, Any]]=None, timeout: float=DEFAULT_GATHER_TIMEOUT) -> List[Tuple[Any, Any, Any]]:
+    """
+    Run several requests concurrently from synchronous code. See gather_requests().
+    """
+    import asyncio
+    return asyncio.run(gather_requests(requests, timeout=timeout))
@@ -0,0 +1,168 @@
+from swiftbar import storage
+from swiftbar.plugin import flush_pending_menus
+from types import ModuleType
+from typing import List, NamedTuple, Union
+import contextlib
+import heapq
+import importlib.util
+import io
+import os
+import re
+import sys
+import time
+import traceback
+
+# Run with `python3 -m swiftbar.runner plugin1.py plugin2.py ...` from the repository root. Every plugin's
+# main() is imported once and called on the interval encoded in its file name, and the output is written to
+# a file that a tiny shell stub (see --stubs) hands to xbar/SwiftBar without starting a Python interpreter.
+
+DEFAULT_OUTPUT_DIR = os.path.join(storage.STATE_DIR, 'runner')
+INTERVAL_PATTERN = re.compile(r'\.(\d+)(ms|s|m|h|d)\.[^.]+$')
+INTERVAL_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+STUB_TEMPLATE = '''#!/bin/sh
+{metadata}
+# Generated by swiftbar.runner. Print the runner's latest output for this plugin while the runner is alive,
+# otherwise (or when invoked with arguments, e.g., from the Settings menu) run the plugin itself.
+OUTPUT={output_file}
+PID_FILE={pid_file}
+if [ $# -eq 0 ] && [ -s "$OUTPUT" ] && read pid < "$PID_FILE" 2>/dev/null && kill -0 "$pid" 2>/dev/null; then
+    exec cat "$OUTPUT"
+fi
+exec {plugin_path} "$@"
+'''
+
+class HostedPlugin(NamedTuple):
+    path: str
+    interval: float
+    module: ModuleType
+    output_file: str
+
+def get_interval(path: str=None) -> Union[float, None]:
+    """
+    Return the refresh interval in seconds encoded in a plugin file name, e.g., 2 for foo.2s.py.
+    """
+    match = INTERVAL_PATTERN.search(os.path.basename(path))
+    if match:
+        return int(match.group(1)) * INTERVAL_UNITS[match.group(2)]
+    return None
+
+def get_output_file(path: str=None, output_dir: str=DEFAULT_OUTPUT_DIR) -> str:
+    return os.path.join(output_dir, os.path.basename(path)) + '.out'
+
+def get_pid_file(output_dir: str=DEFAULT_OUTPUT_DIR) -> str:
+    return os.path.join(output_dir, 'runner.pid')
+
+def load_plugin(path: str=None, output_dir: str=DEFAULT_OUTPUT_DIR) -> HostedPlugin:
+    """
+    Import a plugin file once so its main() can be called repeatedly. Plugin file names contain dashes and
+    dots, so they are loaded by path under a synthetic module name.
+    """
+    path = os.path.realpath(path)
+    interval = get_interval(path)
+    if interval is None:
+        raise ValueError(f'Cannot determine the refresh interval of "{path}"')
+    module_name = 'swiftbar_hosted_' + re.sub(r'\W', '_', os.path.basename(path))
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if not callable(getattr(module, 'main', None)):
+        raise ValueError(f'"{path}" does not define main()')
+    return HostedPlugin(path=path, interval=interval, module=module, output_file=get_output_file(path, output_dir))
+
+def run_plugin(plugin: HostedPlugin=None) -> str:
+    """
+    Call the plugin's main() as if it had been executed by the host app and atomically write its output.
+    """
+    buffer = io.StringIO()
+    saved_argv = sys.argv
+    sys.argv = [plugin.path]
+    try:
+        with contextlib.redirect_stdout(buffer):
+            try:
+                plugin.module.main()
+            finally:
+                # Keep what a plugin that raised or exited had buffered out of the next run, and keep its
+                # partial menu after an exit()
+                flush_pending_menus()
+    except SystemExit:
+        pass
+    except Exception:
+        buffer = io.StringIO()
+        buffer.write(f'{os.path.basename(plugin.path)}: Error\n---\n')
+        for line in traceback.format_exc().strip().splitlines():
+            buffer.write(f'{line} | font=AndaleMono size=11 trim=false\n')
+    finally:
+        sys.argv = saved_argv
+    output = buffer.getvalue()
+    storage.write_text(plugin.output_file, output)
+    return output
+
+def write_stub(plugin: HostedPlugin=None, stub_dir: str=None, output_dir: str=DEFAULT_OUTPUT_DIR) -> str:
+    """
+    Write an executable shell stub with the same file name and xbar/SwiftBar metadata as the plugin.
+    """
+    import shlex
+    with open(plugin.path, 'r') as fh:
+        metadata = '\n'.join(line.rstrip('\n') for line in fh if re.match(r'^#\s*<(xbar|swiftbar)\.', line))
+    stub_path = os.path.join(stub_dir, os.path.basename(plugin.path))
+    storage.write_text(stub_path, STUB_TEMPLATE.format(
+        metadata=metadata,
+        output_file=shlex.quote(plugin.output_file),
+        pid_file=shlex.quote(get_pid_file(output_dir)),
+        plugin_path=shlex.quote(plugin.path),
+    ))
+    os.chmod(stub_path, 0o755)
+    return stub_path
+
+def run(plugins: List[HostedPlugin]=None, once: bool=False) -> None:
+    """
+    Run every plugin on its own interval, soonest first. Plugins run one at a time because they all write to
+    the process-wide sys.stdout.
+    """
+    schedule = [(time.monotonic(), i) for i in range(len(plugins))]
+    heapq.heapify(schedule)
+    while schedule:
+        next_run, i = heapq.heappop(schedule)
+        delay = next_run - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        run_plugin(plugins[i])
+        if not once:
+            heapq.heappush(schedule, (max(next_run + plugins[i].interval, time.monotonic()), i))
+
+def main() -> None:
+    import argparse
+    parser = argparse.ArgumentParser(description='Host several plugins in one long-lived Python process')
+    parser.add_argument('plugins', help='Plugin files to host', nargs='+')
+    parser.add_argument('--output-dir', help='Directory for the plugin output files', required=False, default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument('--stubs', help='Write shell stubs for the plugins to this directory', required=False, default=None)
+    parser.add_argument('--host', help='Host app to report to the plugins', required=False, default=None, choices=['SwiftBar', 'xbar'])
+    parser.add_argument('--once', help='Run every plugin once and exit', required=False, default=False, action='store_true')
+    args = parser.parse_args()
+
+    # The runner's parent isn't the host app, so let Plugin detect the host from the environment instead
+    if args.host == 'SwiftBar':
+        os.environ['SWIFTBAR'] = '1'
+    elif args.host == 'xbar':
+        os.environ['XBAR'] = '1'
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    plugins = [load_plugin(path, args.output_dir) for path in args.plugins]
+    if args.stubs:
+        os.makedirs(args.stubs, exist_ok=True)
+        for plugin in plugins:
+            write_stub(plugin, args.stubs, args.output_dir)
+
+    pid_file = get_pid_file(args.output_dir)
+    storage.write_text(pid_file, f'{os.getpid()}\n')
+    try:
+        run(plugins, once=args.once)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        with contextlib.suppress(OSError):
+            os.unlink(pid_file)
+
+if __name__ == '__main__':
+    main()
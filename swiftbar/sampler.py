@@ -0,0 +1,126 @@
+from collections import deque
+from swiftbar import storage
+from typing import Any, Dict, List, NamedTuple, Tuple, Union
+import os
+import sys
+import time
+
+# Run with `python3 -m swiftbar.sampler` from the repository root. Plugins that find a fresh
+# state file read the latest deltas from it instead of sleeping between two samples.
+
+DEFAULT_STATE_FILE = os.path.join(storage.STATE_DIR, 'sampler.json')
+DEFAULT_INTERVAL = 1.0
+DEFAULT_HISTORY = 10
+CPU_TIME_FIELDS = ['user', 'nice', 'system', 'idle']
+# psutil does not report collisions, so that counter is always 0 when it comes from the sampler
+IO_COUNTER_FIELDS = ['bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv', 'errin', 'errout', 'collisions']
+
+class CpuPercent(NamedTuple):
+    user: float
+    nice: float
+    system: float
+    idle: float
+
+def take_sample() -> Dict[str, Any]:
+    """
+    Take a single sample of the per-CPU times and the per-interface counters.
+    """
+    from psutil import cpu_times, net_io_counters
+    return {
+        'timestamp': time.time(),
+        'cpu': [[getattr(cpu, field) for field in CPU_TIME_FIELDS] for cpu in cpu_times(percpu=True)],
+        'net': {interface: [getattr(counters, field, 0) for field in IO_COUNTER_FIELDS] for interface, counters in net_io_counters(pernic=True).items()},
+    }
+
+def calculate_cpu_percent(first: List[List[float]]=None, second: List[List[float]]=None) -> List[CpuPercent]:
+    """
+    Compute per-CPU percentages from two lists of per-CPU times ordered as CPU_TIME_FIELDS.
+    """
+    cpu_percent: List[CpuPercent] = []
+    for before, after in zip(first, second):
+        deltas = [max(a - b, 0.0) for a, b in zip(after, before)]
+        total = sum(deltas)
+        cpu_percent.append(CpuPercent(*[round(delta / total * 100, 1) if total else 0.0 for delta in deltas]))
+    return cpu_percent
+
+def calculate_io_counter_rates(first: List[int]=None, second: List[int]=None, elapsed: float=1.0) -> Dict[str, int]:
+    """
+    Compute per-second rates from two lists of interface counters ordered as IO_COUNTER_FIELDS.
+    """
+    return {field: int((after - before) / elapsed) for field, before, after in zip(IO_COUNTER_FIELDS, first, second)}
+
+def read_samples(state_file: str=DEFAULT_STATE_FILE) -> Union[List[Dict[str, Any]], None]:
+    """
+    Return the sampler's ring buffer if the sampler is alive, otherwise None. The state is considered
+    stale if the newest sample is older than three sampling intervals.
+    """
+    state = storage.read_json(state_file)
+    if not state or len(state.get('samples', [])) < 2:
+        return None
+    if time.time() - state['samples'][-1]['timestamp'] > state['interval'] * 3:
+        return None
+    return state['samples']
+
+def get_cpu_percent(state_file: str=DEFAULT_STATE_FILE) -> Union[List[CpuPercent], None]:
+    """
+    Compute per-CPU percentages from the two most recent samples, mirroring psutil.cpu_times_percent().
+    """
+    samples = read_samples(state_file)
+    if not samples:
+        return None
+    first, second = samples[-2]['cpu'], samples[-1]['cpu']
+    if len(first) != len(second):
+        return None
+    return calculate_cpu_percent(first, second)
+
+def get_io_counters_delta(interface: str=None, state_file: str=DEFAULT_STATE_FILE) -> Union[Tuple[Dict[str, int], Dict[str, int]], None]:
+    """
+    Return a tuple of the per-second interface counter rates and the latest counter totals.
+    """
+    samples = read_samples(state_file)
+    if not samples:
+        return None
+    first, second = samples[-2], samples[-1]
+    if interface not in first['net'] or interface not in second['net']:
+        return None
+    elapsed = second['timestamp'] - first['timestamp']
+    if elapsed <= 0:
+        return None
+    rates = calculate_io_counter_rates(first['net'][interface], second['net'][interface], elapsed)
+    totals = dict(zip(IO_COUNTER_FIELDS, second['net'][interface]))
+    return rates, totals
+
+def run(state_file: str=DEFAULT_STATE_FILE, interval: float=DEFAULT_INTERVAL, history: int=DEFAULT_HISTORY) -> None:
+    """
+    Sample forever, keeping the last `history` samples in a ring buffer that is written to state_file on every tick.
+    """
+    os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    samples = deque(maxlen=history)
+    next_tick = time.monotonic()
+    while True:
+        samples.append(take_sample())
+        storage.write_json(state_file, {'pid': os.getpid(), 'interval': interval, 'samples': list(samples)})
+        next_tick += interval
+        time.sleep(max(next_tick - time.monotonic(), 0))
+
+def main() -> None:
+    import argparse
+    parser = argparse.ArgumentParser(description='Sample CPU times and interface counters for the 2s plugins')
+    parser.add_argument('--state-file', help='Path of the JSON state file', required=False, default=DEFAULT_STATE_FILE)
+    parser.add_argument('--interval', help='Seconds between samples', required=False, default=DEFAULT_INTERVAL, type=float)
+    parser.add_argument('--history', help='Number of samples to keep', required=False, default=DEFAULT_HISTORY, type=int)
+    args = parser.parse_args()
+
+    try:
+        import psutil
+    except ImportError:
+        print('Please install the following packages via pip: psutil', file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        run(state_file=args.state_file, interval=args.interval, history=max(args.history, 2))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
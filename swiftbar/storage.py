@@ -0,0 +1,67 @@
+from typing import Any, Iterator, Union
+import contextlib
+import json
+import os
+import threading
+
+# Samples, sessions, indexes and other runtime state live here rather than in plugin.config_dir, which is the
+# xbar plugins folder when running under xbar, where the host would try to run every file that isn't a plugin
+STATE_DIR = os.path.join(os.path.expanduser('~'), '.config', 'SwiftBar', 'state')
+
+def _write_atomic(path: str=None, contents: Union[str, bytes]=None, mode: str='w', permissions: int=0o666) -> None:
+    # A pid- and thread-unique name in the same directory avoids importing tempfile on the plugin startup path
+    tmp_path = os.path.join(os.path.dirname(path) or '.', f'.{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp')
+    try:
+        # O_EXCL refuses a file or symlink that is already there, which matters in shared directories like /tmp
+        with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, permissions), mode) as fh:
+            fh.write(contents)
+        os.replace(tmp_path, path)
+    except:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def write_text(path: str=None, contents: str=None, permissions: int=0o666) -> None:
+    """
+    Write contents to path via a temporary file and os.replace() so readers never see a partial file. The file is
+    created with permissions, less the umask.
+    """
+    _write_atomic(path, contents, 'w', permissions)
+
+def write_bytes(path: str=None, contents: bytes=None, permissions: int=0o666) -> None:
+    """
+    Atomically write binary contents to path, created with permissions, less the umask.
+    """
+    _write_atomic(path, contents, 'wb', permissions)
+
+def write_json(path: str=None, contents: Any=None, permissions: int=0o666) -> None:
+    """
+    Atomically write contents to path as JSON.
+    """
+    write_text(path, json.dumps(contents), permissions)
+
+def read_json(path: str=None) -> Union[Any, None]:
+    """
+    Read a JSON file, returning None if it is missing or unparsable.
+    """
+    try:
+        with open(path, 'r') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+@contextlib.contextmanager
+def locked(path: str=None) -> Iterator[None]:
+    """
+    Hold an exclusive advisory lock on path + '.lock' for the duration of the block, so that cooperating
+    processes don't refresh the same cached file at the same time.
+    """
+    import fcntl
+    with open(f'{path}.lock', 'a') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
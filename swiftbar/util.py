@@ -1,17 +1,21 @@
 from collections import namedtuple
-from pprint import pprint as pp
-from swiftbar import request
-from typing import Any, Dict, List, NamedTuple, Optional, Union
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
 import datetime
-import dateutil
-import getpass
-import platform
+import os
 import re
-import shutil
+import shlex
 import signal
 import subprocess
 import time
 
+# Modules that are only needed by a few code paths (request, storage, dateutil, platform, pprint, shutil, getpass,
+# socket, tempfile, threading) are imported inside the functions that use them to keep plugin startup fast.
+
+# Lookups keyed on the machine's primary address are reused until the network changes or the TTL expires
+PUBLIC_IP_TTL = 3600
+GEOLOCATION_TTL = 6 * 3600
+GEOLOCATION_CACHE_FILE = 'geolocation.json'
+
 class GeoData(NamedTuple):
     City: str
     Country: str
@@ -70,6 +74,7 @@ def get_macos_version() -> str:
     """
     Determine the current OS version and return it as the full OS string.
     """
+    import platform
     os_version = parse_version(platform.mac_ver()[0])
     macos_families = {
         '10.0': 'Cheetah',
@@ -104,21 +109,117 @@ def pprint(input: Any=None):
     """
     Pretty print the supplied input.
     """
+    from pprint import pprint as pp
     pp(input)
     print()
 
-def execute_command(command: str=None, input: Optional[Any]=None):
+def split_pipeline(command: str=None) -> List[List[str]]:
+    """
+    Split a command string on unquoted pipes into a list of argv lists using shell quoting rules.
+    No other shell syntax is supported, so pass argv lists to execute_pipeline() for anything unusual.
     """
-    Execute a system command, returning exit code, stdout, and stderr.
+    lexer = shlex.shlex(command, posix=True, punctuation_chars='|')
+    lexer.whitespace_split = True
+    stages: List[List[str]] = [[]]
+    for token in lexer:
+        if token == '|':
+            stages.append([])
+        elif set(token) == {'|'}:
+            raise ValueError(f'Unsupported shell operator "{token}" in "{command}"')
+        else:
+            stages[-1].append(token)
+    if any(len(stage) == 0 for stage in stages):
+        raise ValueError(f'Empty pipeline stage in "{command}"')
+    return stages
+
+def execute_pipeline(commands: List[List[str]]=None, input: Optional[Any]=None, timeout: Optional[float]=None) -> Tuple[int, str, str]:
     """
-    for command in re.split(r'\s*\|\s*', command):
-        p = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, stderr = p.communicate(input=input.encode('utf-8') if input else None)
-        stdout = stdout.decode('utf-8').strip()
-        stderr = stderr.decode('utf-8').strip()
-        if stdout:
-            input = stdout
-    return p.returncode, stdout, stderr
+    Execute a list of argv lists connected by OS pipes, without a shell, so every stage runs at the same time.
+    Return the exit code and stdout of the last stage and the stderr of all stages. If timeout seconds elapse
+    before the pipeline finishes, every stage is killed.
+    """
+    import tempfile
+    import threading
+
+    if isinstance(input, str):
+        input = input.encode('utf-8')
+
+    processes: List[subprocess.Popen] = []
+    stderr_files = []
+    try:
+        for i, argv in enumerate(commands):
+            if i == 0:
+                stdin = subprocess.PIPE if input is not None else subprocess.DEVNULL
+            else:
+                stdin = processes[-1].stdout
+            if i < len(commands) - 1:
+                stderr = tempfile.TemporaryFile()
+                stderr_files.append(stderr)
+            else:
+                stderr = subprocess.PIPE
+            try:
+                processes.append(subprocess.Popen(argv, stdin=stdin, stdout=subprocess.PIPE, stderr=stderr))
+            except (FileNotFoundError, PermissionError) as e:
+                for p in processes:
+                    p.kill()
+                    p.wait()
+                return 127, '', f'{argv[0]}: {e.strerror}'
+            if i > 0:
+                # Close our copy so the previous stage gets SIGPIPE if this one exits early
+                processes[-2].stdout.close()
+
+        first, last = processes[0], processes[-1]
+        if input is not None and len(processes) > 1:
+            # Feed the first stage from a thread so a large input can't deadlock against the last stage's output
+            def feed() -> None:
+                try:
+                    first.stdin.write(input)
+                except BrokenPipeError:
+                    pass
+                finally:
+                    first.stdin.close()
+            threading.Thread(target=feed, daemon=True).start()
+            last_input = None
+        else:
+            last_input = input
+
+        timed_out = False
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        try:
+            stdout, stderr = last.communicate(input=last_input, timeout=timeout)
+            for p in processes[:-1]:
+                p.wait(timeout=max(deadline - time.monotonic(), 0) if deadline else None)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            for p in processes:
+                p.kill()
+            stdout, stderr = last.communicate()
+            for p in processes[:-1]:
+                p.wait()
+
+        stderr_chunks = []
+        for stderr_file in stderr_files:
+            stderr_file.seek(0)
+            stderr_chunks.append(stderr_file.read())
+        stderr_chunks.append(stderr)
+        stderr = b'\n'.join(chunk.strip() for chunk in stderr_chunks if chunk.strip()).decode('utf-8')
+        if timed_out:
+            stderr = '\n'.join(filter(None, [stderr, f'Command timed out after {timeout} seconds']))
+        return last.returncode, stdout.decode('utf-8').strip(), stderr
+    finally:
+        for stderr_file in stderr_files:
+            stderr_file.close()
+
+def execute_command(command: Union[str, List[str]]=None, input: Optional[Any]=None, timeout: Optional[float]=None) -> Tuple[int, str, str]:
+    """
+    Execute a system command, returning exit code, stdout, and stderr. The command may be a string, which can
+    contain pipes, or a single argv list.
+    """
+    if isinstance(command, str):
+        commands = split_pipeline(command)
+    else:
+        commands = [command]
+    return execute_pipeline(commands, input=input, timeout=timeout)
 
 def brew_package_installed(package: str=None) -> bool:
     """
@@ -127,24 +228,88 @@ def brew_package_installed(package: str=None) -> bool:
     returncode, stdout, stderr = execute_command(f'brew list {package}')
     return True if returncode == 0 else False
 
-def geolocate_me() -> Union[Dict, None]:
+def get_primary_address() -> Union[str, None]:
     """
-    Attempt to geolocate you based on your public IP address.
+    Return the local address of the interface that carries the default route. Connecting a UDP socket
+    doesn't send any packets, it only makes the kernel pick a route and a source address.
     """
+    import socket
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(('8.8.8.8', 53))
+            return sock.getsockname()[0]
+    except OSError:
+        return None
+
+def _read_location_cache(cache_dir: str=None, name: str=None, ttl: int=0) -> Union[Any, None]:
+    """
+    Return a cached lookup if it is younger than ttl and was made from the current primary address.
+    """
+    from swiftbar import storage
+    cache = storage.read_json(os.path.join(cache_dir, GEOLOCATION_CACHE_FILE)) or {}
+    entry = cache.get(name)
+    if not entry or time.time() - entry['timestamp'] >= ttl or entry['address'] != get_primary_address():
+        return None
+    return entry['value']
+
+def _write_location_cache(cache_dir: str=None, name: str=None, value: Any=None) -> None:
+    from swiftbar import storage
+    cache_file = os.path.join(cache_dir, GEOLOCATION_CACHE_FILE)
+    try:
+        with storage.locked(cache_file):
+            cache = storage.read_json(cache_file) or {}
+            cache[name] = {'timestamp': time.time(), 'address': get_primary_address(), 'value': value}
+            storage.write_json(cache_file, cache, permissions=0o600)
+    except OSError:
+        pass
+
+def get_public_ip(cache_dir: str=None, ttl: int=PUBLIC_IP_TTL) -> Union[str, None]:
+    """
+    Return your public IP address. If cache_dir is set, the address is cached there for ttl seconds
+    or until the primary local address changes.
+    """
+    if cache_dir:
+        address = _read_location_cache(cache_dir, 'public_ip', ttl)
+        if address:
+            return address
+
+    from swiftbar import request
     headers = {'User-Agent': 'curl/8.7.1'}
-    response, data, error = request.swiftbar_request(host='ifconfig.io', headers=headers)
+    try:
+        response, data, error = request.swiftbar_request(host='ifconfig.io', headers=headers)
+    except OSError:
+        return None
     if response.status == 200 and data:
         address = data.strip()
     else:
         return None
-    
-    response, geodata, _ = request.swiftbar_request(host='ipinfo.io', path=f'/{address}/json', return_type='json')
+
+    if cache_dir:
+        _write_location_cache(cache_dir, 'public_ip', address)
+    return address
+
+def geolocate_me(cache_dir: str=None, ttl: int=GEOLOCATION_TTL) -> Union[GeoData, None]:
+    """
+    Attempt to geolocate you based on your public IP address. If cache_dir is set, the result is cached
+    there for ttl seconds or until the primary local address changes.
+    """
+    if cache_dir:
+        geodata = _read_location_cache(cache_dir, 'geodata', ttl)
+        if geodata:
+            return GeoData(**geodata)
+
+    # ipinfo.io reports on the caller's own address, so this doesn't have to wait for get_public_ip()
+    from swiftbar import request
+    try:
+        response, geodata, _ = request.swiftbar_request(host='ipinfo.io', path='/json', return_type='json')
+    except OSError:
+        return None
     if response.status != 200:
-        return None, {}, 'Failed to geolocate'
+        return None
     
     try:
         lat, lon = re.split(r'\s*,\s*', geodata['loc'])
-        return GeoData(
+        geodata = GeoData(
             City=geodata['city'],
             Country=geodata['country'],
             IP=geodata['ip'],
@@ -157,7 +322,13 @@ def geolocate_me() -> Union[Dict, None]:
     except:
         return None
 
+    if cache_dir:
+        _write_location_cache(cache_dir, 'public_ip', geodata.IP)
+        _write_location_cache(cache_dir, 'geodata', geodata._asdict())
+    return geodata
+
 def binary_exists(binary: str=None) -> bool:
+    import shutil
     return shutil.which(binary) is not None
 
 def find_all_network_interfaces() -> List[str]:
@@ -234,6 +405,7 @@ def get_process_icon(process_owner: str=None, click_to_kill: bool=False) -> str:
     Return a skull icon if a process can be kill or a no entry sign icon if it cannot.
     """
     if click_to_kill:
+        import getpass
         if process_owner == getpass.getuser():
             return ':skull:'
         else:
@@ -290,6 +462,7 @@ def prettify_timestamp(timestamp: str=None, format:str='%Y-%m-%d %H:%M:%S'):
     Parse a data-based timestamp and convert it to the specified format.
     """
     try:
+        import dateutil.parser
         parsed = dateutil.parser.parse(timestamp)
         seconds = parsed.timestamp()
         new_timestamp = datetime.datetime.fromtimestamp(seconds)
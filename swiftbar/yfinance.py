@@ -1,9 +1,33 @@
-from swiftbar import util, request
-from typing import Any, Dict, List, Union
+from swiftbar import util, request, storage
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple, Union
+import os
+import threading
 import time
 
 # https://financeapi.net/
 
+# Upper bound on concurrent requests when fetching data for several symbols at once
+MAX_WORKERS = 8
+# The spark endpoint rejects requests for more than 20 symbols
+SPARK_CHUNK_SIZE = 20
+# Crumbs stay valid for a long time and are refreshed automatically when Yahoo rejects one
+SESSION_TTL = 7 * 86400
+SESSION_FILE = 'yfinance.session.json'
+# Quote summary modules marked as static, e.g., the company profile, are downloaded at most once a day
+STATIC_MODULE_TTL = 86400
+
+# The cookie and crumb currently in use, shared by the threads of a fan-out so one refresh serves them all.
+# refreshed_from, once set, is the rejected crumb the last refresh replaced, so threads holding it don't refresh again even
+# if that refresh failed. _refresh_lock is held for the whole refresh, so only one thread fetches at a time.
+_session: Dict[str, Any] = {'cache_dir': None, 'cookie': None, 'crumb': None}
+_session_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+
+class Quote(NamedTuple):
+    Symbol: str
+    Price: float
+    PreviousClose: float
+
 def _get_valid_ranges() -> List[str]:
     return ['1d', '5d', '1mo', '3mo', '6mo', '1y', '2y', '5y', '10y', 'ytd', 'max']
 
@@ -16,9 +40,21 @@ def _get_valid_regions() -> List[str]:
 def _get_valid_quote_summary_modules() -> List[str]:
     return ['assetProfile', 'balanceSheetHistory', 'balanceSheetHistory', 'balanceSheetHistoryQuarterly', 'calendarEvents', 'cashflowStatementHistory', 'cashflowStatementHistory', 'cashflowStatementHistoryQuarterly', 'defaultKeyStatistics', 'earnings', 'earningsHistory', 'earningsTrend', 'esgScores', 'financialData', 'fundOwnership', 'fundProfile', 'incomeStatementHistory', 'incomeStatementHistoryQuarterly', 'indexTrend', 'insiderHolders', 'insiderTransactions', 'institutionOwnership', 'majorDirectHolders', 'majorHoldersBreakdown', 'netSharePurchaseActivity', 'price', 'quoteType', 'recommendationTrend', 'secFilings', 'sectorTrend', 'summaryDetail', 'upgradeDowngradeHistory']
 
-def get_cookie_and_crumb():
+def _fan_out(function: Callable=None, items: List[Any]=None, max_workers: int=MAX_WORKERS) -> List[Any]:
+    """
+    Call function once per item on a bounded thread pool and return the results in the order of items.
+    """
+    if len(items) < 2:
+        return [function(item) for item in items]
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(function, items))
+
+def _fetch_cookie_and_crumb() -> Tuple[Union[str, None], Union[str, None]]:
+    # An old cookie or crumb is useless, so never fall back to the last good response for these
     response, _, _ = request.swiftbar_request(
         host='fc.yahoo.com',
+        stale_if_error=False,
     )
     cookie = next((h[1] for h in response.headers.items() if h[0] == 'Set-Cookie'), None)
     if not cookie:
@@ -29,23 +65,101 @@ def get_cookie_and_crumb():
         path='/v1/test/getcrumb',
         headers={'Cookie': cookie, 'User-Agent': request.get_useragent()},
         return_type='text',
+        stale_if_error=False,
     )
     if response.status == 200 and crumb:
         return cookie, crumb
     else:
         return None, None
 
-def get_options(crumb: str=None, cookie: str=None, symbol: str=None, date:int =int(time.time())):
-    headers = {'Cookie': cookie, 'User-Agent': request.get_useragent()}
+def get_cookie_and_crumb(cache_dir: str=None, ttl: int=SESSION_TTL, refresh: bool=False, stale_crumb: str=None) -> Tuple[Union[str, None], Union[str, None]]:
+    """
+    Return a Yahoo! Finance cookie and crumb. If cache_dir is set, e.g., to plugin.state_dir, the pair is shared by
+    all of the finance plugins through a session file that is locked while it is read or refreshed, so only one
+    plugin fetches a new crumb once the cached one is older than ttl seconds or refresh is set. With refresh and
+    stale_crumb, a session file whose crumb is no longer stale_crumb was already refreshed by another plugin and
+    is used as-is.
+    """
+    if not cache_dir:
+        cookie, crumb = _fetch_cookie_and_crumb()
+    else:
+        session_file = os.path.join(cache_dir, SESSION_FILE)
+        with storage.locked(session_file):
+            session = storage.read_json(session_file)
+            usable = bool(session and session.get('cookie') and session.get('crumb'))
+            if usable and refresh and stale_crumb:
+                usable = session['crumb'] != stale_crumb
+            elif usable:
+                usable = not refresh and time.time() - session.get('timestamp', 0) < ttl
+            if usable:
+                cookie, crumb = session['cookie'], session['crumb']
+            else:
+                cookie, crumb = _fetch_cookie_and_crumb()
+                if cookie and crumb:
+                    storage.write_json(session_file, {'timestamp': time.time(), 'cookie': cookie, 'crumb': crumb}, permissions=0o600)
+    with _session_lock:
+        _session.update({'cache_dir': cache_dir, 'cookie': cookie, 'crumb': crumb})
+    return cookie, crumb
+
+def _refresh_session(stale_crumb: str=None) -> Tuple[Union[str, None], Union[str, None]]:
+    """
+    Replace a crumb that Yahoo rejected, unless another thread already has or already tried to.
+    """
+    with _refresh_lock:
+        with _session_lock:
+            if (_session['crumb'] and _session['crumb'] != stale_crumb) or ('refreshed_from' in _session and _session['refreshed_from'] == stale_crumb):
+                return _session['cookie'], _session['crumb']
+            cache_dir = _session['cache_dir']
+        cookie, crumb = get_cookie_and_crumb(cache_dir=cache_dir, refresh=True, stale_crumb=stale_crumb)
+        with _session_lock:
+            _session['refreshed_from'] = stale_crumb
+        return cookie, crumb
+
+def _is_invalid_crumb(response: Any=None, output: Any=None) -> bool:
+    if response.status == 401:
+        return True
+    try:
+        return 'invalid crumb' in output['finance']['error']['description'].lower()
+    except (KeyError, TypeError, AttributeError):
+        return False
+
+def _finance_request(crumb: str=None, cookie: str=None, host: str=None, path: str=None, query: Dict[str, Any]=None, cache_ttl: float=None, cache_dir: str=None) -> Tuple[Any, Any]:
+    """
+    Make an authenticated JSON request, refreshing the cookie and crumb and retrying once if Yahoo rejects the crumb.
+    """
     response, output, _ = request.swiftbar_request(
+        host=host,
+        path=path,
+        query=query,
+        headers={'Cookie': cookie, 'User-Agent': request.get_useragent()},
+        return_type='json',
+        cache_ttl=cache_ttl,
+        cache_dir=cache_dir,
+    )
+    if _is_invalid_crumb(response, output):
+        cookie, crumb = _refresh_session(crumb)
+        if cookie and crumb:
+            response, output, _ = request.swiftbar_request(
+                host=host,
+                path=path,
+                query=dict(query, crumb=crumb),
+                headers={'Cookie': cookie, 'User-Agent': request.get_useragent()},
+                return_type='json',
+                cache_ttl=cache_ttl,
+                cache_dir=cache_dir,
+            )
+    return response, output
+
+def get_options(crumb: str=None, cookie: str=None, symbol: str=None, date:int =int(time.time())):
+    response, output = _finance_request(
+        crumb=crumb,
+        cookie=cookie,
         host='query2.finance.yahoo.com',
         path=f'/v7/finance/options/{symbol}',
         query={
             'crumb': crumb,
             'symbol': symbol,
         },
-        headers=headers,
-        return_type='json',
     )
     if response.status == 200 and output:
         return output
@@ -53,8 +167,9 @@ def get_options(crumb: str=None, cookie: str=None, symbol: str=None, date:int =i
         return None
 
 def get_spark_data(crumb: str=None, cookie: str=None, symbols: List[str]=None, interval:str = '1d', range: str='1d'):
-    headers = {'Cookie': cookie, 'User-Agent': request.get_useragent()}
-    response, output, _ = request.swiftbar_request(
+    response, output = _finance_request(
+        crumb=crumb,
+        cookie=cookie,
         host='query1.finance.yahoo.com',
         path=f'/v7/finance/spark',
         query={
@@ -63,17 +178,55 @@ def get_spark_data(crumb: str=None, cookie: str=None, symbols: List[str]=None, i
             'range': range,
             'symbols': ','.join(symbols),
         },
-        headers=headers,
-        return_type='json',
     )
     if response.status == 200 and output:
         return output
     else:
         return None
 
-def get_quote_summary(crumb: str=None, cookie: str=None, symbol: str=None, lang: str='en', region: str='US', modules: List[str]=None):
-    headers = {'Cookie': cookie, 'User-Agent': request.get_useragent()}
-    response, output, _ = request.swiftbar_request(
+def _parse_spark_quote(symbol: str=None, data: Dict[str, Any]=None) -> Union[Quote, None]:
+    """
+    Build a Quote from either spark response shape: the v7 result entry with a chart-like meta, or the
+    flattened per-symbol entry with a list of closing prices.
+    """
+    if 'response' in data:
+        if not data['response']:
+            return None
+        data = data['response'][0].get('meta', {})
+        price = data.get('regularMarketPrice')
+    else:
+        closes = [close for close in data.get('close') or [] if close is not None]
+        price = closes[-1] if closes else None
+    previous_close = data.get('previousClose') or data.get('chartPreviousClose')
+    if price is None or previous_close is None:
+        return None
+    return Quote(Symbol=symbol, Price=price, PreviousClose=previous_close)
+
+def get_quotes(crumb: str=None, cookie: str=None, symbols: List[str]=None, chunk_size: int=SPARK_CHUNK_SIZE) -> Dict[str, Quote]:
+    """
+    Fetch the current price and previous close for any number of symbols with one spark request per chunk_size
+    symbols. Returns a dict of Quotes keyed by symbol in the order of symbols, omitting symbols without data.
+    """
+    chunks = [symbols[i:i + chunk_size] for i in range(0, len(symbols), chunk_size)]
+    found = {}
+    for output in _fan_out(lambda chunk: get_spark_data(crumb=crumb, cookie=cookie, symbols=chunk), chunks):
+        if not output:
+            continue
+        if 'spark' in output:
+            entries = {entry['symbol']: entry for entry in output['spark'].get('result') or []}
+        else:
+            entries = output
+        for symbol, data in entries.items():
+            quote = _parse_spark_quote(symbol, data)
+            if quote:
+                found[symbol.upper()] = quote
+    # Yahoo returns upper case symbols regardless of how they were requested
+    return {symbol: found[symbol.upper()] for symbol in symbols if symbol.upper() in found}
+
+def _get_quote_summary_modules(crumb: str=None, cookie: str=None, symbol: str=None, lang: str='en', region: str='US', modules: List[str]=None, cache_ttl: float=None, cache_dir: str=None) -> Union[Dict[str, Any], None]:
+    response, output = _finance_request(
+        crumb=crumb,
+        cookie=cookie,
         host='query2.finance.yahoo.com',
         path=f'/v10/finance/quoteSummary/{symbol}',
         query={
@@ -85,9 +238,9 @@ def get_quote_summary(crumb: str=None, cookie: str=None, symbol: str=None, lang:
             'region': region,
             'symbol': symbol,
         },
-        headers=headers,
-        return_type='json',
-    )                
+        cache_ttl=cache_ttl,
+        cache_dir=cache_dir,
+    )
     if response.status == 200 and output:
         info = output['quoteSummary']['result'][0]
         company_data = {}
@@ -98,9 +251,41 @@ def get_quote_summary(crumb: str=None, cookie: str=None, symbol: str=None, lang:
     else:
         return None
 
+def get_quote_summary(crumb: str=None, cookie: str=None, symbol: str=None, lang: str='en', region: str='US', modules: List[str]=None, static_modules: List[str]=None, cache_dir: str=None):
+    """
+    Fetch the given quote summary modules for a symbol and merge them into one dict. Modules listed in static_modules,
+    e.g., assetProfile, rarely change, so they are requested separately through the HTTP cache in cache_dir and
+    downloaded at most once every STATIC_MODULE_TTL seconds. Whichever of the two requests succeeded is returned;
+    None is returned only if every request failed.
+    """
+    company_data = {}
+    fetched = False
+    if modules:
+        dynamic_data = _get_quote_summary_modules(crumb=crumb, cookie=cookie, symbol=symbol, lang=lang, region=region, modules=modules)
+        if dynamic_data is not None:
+            company_data.update(dynamic_data)
+            fetched = True
+    if static_modules:
+        static_data = _get_quote_summary_modules(crumb=crumb, cookie=cookie, symbol=symbol, lang=lang, region=region, modules=static_modules, cache_ttl=STATIC_MODULE_TTL, cache_dir=cache_dir)
+        if static_data is not None:
+            company_data.update(static_data)
+            fetched = True
+    return company_data if fetched else None
+
+def get_quote_summaries(crumb: str=None, cookie: str=None, symbols: List[str]=None, lang: str='en', region: str='US', modules: List[str]=None, static_modules: List[str]=None, cache_dir: str=None, max_workers: int=MAX_WORKERS) -> List[Union[Dict[str, Any], None]]:
+    """
+    Fetch the quote summaries for several symbols concurrently. Results are in the same order as symbols.
+    """
+    return _fan_out(
+        lambda symbol: get_quote_summary(crumb=crumb, cookie=cookie, symbol=symbol, lang=lang, region=region, modules=modules, static_modules=static_modules, cache_dir=cache_dir),
+        symbols,
+        max_workers=max_workers,
+    )
+
 def get_chart(crumb: str=None, cookie: str=None, ticker: str=None, interval:str = '1d', range: str='1d', lang: str='en', region: str='US', comparisons: List[str]=[]):
-    headers = {'Cookie': cookie, 'User-Agent': request.get_useragent()}
-    response, output, _ = request.swiftbar_request(
+    response, output = _finance_request(
+        crumb=crumb,
+        cookie=cookie,
         host='query2.finance.yahoo.com',
         path=f'/v8/finance/chart/{ticker}',
         query={
@@ -113,8 +298,6 @@ def get_chart(crumb: str=None, cookie: str=None, ticker: str=None, interval:str
             'range': range,
             'region': region,
         },
-        headers=headers,
-        return_type='json',
     )                
     if response.status == 200 and output:
         return output
@@ -124,8 +307,9 @@ def get_chart(crumb: str=None, cookie: str=None, ticker: str=None, interval:str
 # /v6/finance/recommendationsbysymbol/{symbol}
 
 def get_market_summary(crumb: str=None, cookie: str=None, lang: str='en', region: str='US'):
-    headers = {'Cookie': cookie, 'User-Agent': request.get_useragent()}
-    response, output, _ = request.swiftbar_request(
+    response, output = _finance_request(
+        crumb=crumb,
+        cookie=cookie,
         host='query2.finance.yahoo.com',
         path=f'/v6/finance/quote/marketSummary',
         query={
@@ -133,8 +317,6 @@ def get_market_summary(crumb: str=None, cookie: str=None, lang: str='en', region
             'lang': lang,
             'region': region,
         },
-        headers=headers,
-        return_type='json',
     )                
     if response.status == 200 and output:
         return output
@@ -142,15 +324,14 @@ def get_market_summary(crumb: str=None, cookie: str=None, lang: str='en', region
         return None
 
 def get_trending(crumb: str=None, cookie: str=None, region: str='US'):
-    headers = {'Cookie': cookie, 'User-Agent': request.get_useragent()}
-    response, output, _ = request.swiftbar_request(
+    response, output = _finance_request(
+        crumb=crumb,
+        cookie=cookie,
         host='query1.finance.yahoo.com',
         path=f'/v1/finance/trending/{region}',
         query={
             'crumb': crumb,
         },
-        headers=headers,
-        return_type='json',
     )                
     if response.status == 200 and output:
         return output
@@ -0,0 +1,189 @@
+# Tests for async_swiftbar_request() and gather_requests() in swiftbar.request, against a local asyncio server
+# that answers with each of the body framings HTTP/1.1 allows. Run from the repository root with
+# `python3 -m unittest discover tests` or pytest.
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from swiftbar import request
+from unittest import mock
+import asyncio
+import gzip
+import json
+import tempfile
+import time
+import unittest
+
+BODY = b'{"framing": "%s", "padding": "' + b'x' * 5000 + b'"}'
+
+class TestAsyncRequest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.slow = False
+        self.request_heads = []
+        # Set when the server sees the client hang up on a request it hasn't answered
+        self.abandoned = asyncio.Event()
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.kwargs = {
+            'host': '127.0.0.1',
+            'port': self.server.sockets[0].getsockname()[1],
+            'scheme': 'http',
+            'cache_dir': self.tmp.name,
+            'state_dir': self.tmp.name,
+            'timeout': 5,
+            'retries': 0,
+        }
+
+    async def asyncTearDown(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+        self.tmp.cleanup()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        head = await reader.readuntil(b'\r\n\r\n')
+        self.request_heads.append(head.decode('latin-1'))
+        path = head.split(b' ')[1].decode()
+        framing = path.strip('/').split('?')[0]
+        body = BODY % framing.encode()
+        try:
+            if framing == 'slow' or (self.slow and framing != 'fast'):
+                # Never answer; wait for the client to give up and close the connection
+                await reader.read()
+                self.abandoned.set()
+                return
+            if framing == 'length':
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n' % len(body) + body)
+            elif framing in ('chunked', 'gzip-chunked'):
+                if framing == 'gzip-chunked':
+                    body = gzip.compress(body)
+                writer.write(b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n')
+                writer.write(b'Content-Encoding: gzip\r\n\r\n' if framing == 'gzip-chunked' else b'\r\n')
+                for start in range(0, len(body), 1000):
+                    chunk = body[start:start + 1000]
+                    writer.write(b'%x;ext=1\r\n' % len(chunk) + chunk + b'\r\n')
+                    await writer.drain()
+                writer.write(b'0\r\nX-Trailer: yes\r\n\r\n')
+            elif framing == 'close':
+                writer.write(b'HTTP/1.1 200 OK\r\nConnection: close\r\n\r\n' + body)
+            elif framing in ('gzip-close', 'gzip-truncated'):
+                body = gzip.compress(body)
+                if framing == 'gzip-truncated':
+                    body = body[:len(body) // 2]
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Encoding: gzip\r\nConnection: close\r\n\r\n' + body)
+            elif framing == 'gzip':
+                body = gzip.compress(body)
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Encoding: gzip\r\nContent-Length: %d\r\n\r\n' % len(body) + body)
+            elif framing == 'truncated':
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n' % len(body) + body[:100])
+            else:
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n' % len(body) + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def fetch(self, path: str=None, **kwargs) -> tuple:
+        return await request.async_swiftbar_request(path=path, **dict(self.kwargs, **kwargs))
+
+    async def test_body_framings(self) -> None:
+        for framing in ['length', 'chunked', 'close', 'gzip', 'gzip-chunked', 'gzip-close']:
+            with self.subTest(framing=framing):
+                response, body, err = await self.fetch(f'/{framing}', return_type='binary')
+                self.assertIsNone(err)
+                self.assertEqual(response.status, 200)
+                self.assertFalse(response.from_cache)
+                self.assertEqual(body, BODY % framing.encode())
+
+    async def test_body_framings_in_small_reads(self) -> None:
+        # Every body and every chunk spans several reads, each inflated as it arrives
+        with mock.patch.object(request, 'READ_CHUNK_SIZE', 100):
+            await self.test_body_framings()
+
+    async def test_truncated_compressed_body_is_an_error(self) -> None:
+        response, body, err = await self.fetch('/gzip-truncated', stale_if_error=False)
+        self.assertEqual(response.status, 503)
+        self.assertIsNone(body)
+        self.assertIsInstance(err, EOFError)
+
+    async def test_request_head(self) -> None:
+        await self.fetch('/length', query={'symbol': 'A B'}, encode_query=True)
+        head = self.request_heads[0]
+        self.assertTrue(head.startswith('GET /length?symbol=A%20B HTTP/1.1\r\n'))
+        self.assertIn('Accept-Encoding: gzip\r\n', head)
+        self.assertIn('Connection: close\r\n', head)
+        # The server listens on an ephemeral port, which belongs in the Host header
+        self.assertIn(f'Host: 127.0.0.1:{self.kwargs["port"]}\r\n', head)
+
+    async def test_json(self) -> None:
+        response, body, err = await self.fetch('/gzip', return_type='json')
+        self.assertIsNone(err)
+        self.assertEqual(body['framing'], 'gzip')
+
+    async def test_truncated_body_is_an_error(self) -> None:
+        response, body, err = await self.fetch('/truncated', stale_if_error=False)
+        self.assertEqual(response.status, 503)
+        self.assertIsNone(body)
+        self.assertIsInstance(err, EOFError)
+
+    async def test_timeout_closes_the_connection(self) -> None:
+        start = time.monotonic()
+        response, body, err = await self.fetch('/slow', timeout=0.2)
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual(response.status, 503)
+        self.assertIsNone(body)
+        self.assertIsInstance(err, asyncio.TimeoutError)
+        await asyncio.wait_for(self.abandoned.wait(), 2)
+
+    async def test_timeout_serves_the_last_good_response(self) -> None:
+        response, body, err = await self.fetch('/length')
+        self.slow = True
+        response, stale_body, err = await self.fetch('/length', timeout=0.2)
+        self.assertEqual(response.status, 200)
+        self.assertTrue(response.from_cache)
+        self.assertEqual(stale_body, body)
+
+    async def test_gather_keeps_order(self) -> None:
+        framings = ['chunked', 'length', 'gzip', 'close']
+        results = await request.gather_requests([dict(self.kwargs, path=f'/{framing}', return_type='json') for framing in framings])
+        self.assertEqual([body['framing'] for _, body, _ in results], framings)
+
+    async def test_gather_timeout_cancels_unfinished_requests(self) -> None:
+        start = time.monotonic()
+        results = await request.gather_requests([
+            dict(self.kwargs, path='/fast', return_type='json'),
+            dict(self.kwargs, path='/slow', return_type='json', timeout=30),
+        ], timeout=0.3)
+        self.assertLess(time.monotonic() - start, 2)
+        (fast_response, fast_body, fast_err), (slow_response, slow_body, slow_err) = results
+        self.assertEqual(fast_response.status, 200)
+        self.assertEqual(fast_body['framing'], 'fast')
+        self.assertEqual(slow_response.status, 503)
+        self.assertIsNone(slow_body)
+        self.assertIsInstance(slow_err, TimeoutError)
+        # The cancelled request closed its connection rather than leaving it open
+        await asyncio.wait_for(self.abandoned.wait(), 2)
+
+    async def test_gather_timeout_serves_the_last_good_response(self) -> None:
+        (_, body, _), = await request.gather_requests([dict(self.kwargs, path='/length')])
+        self.slow = True
+        (response, stale_body, err), = await request.gather_requests([dict(self.kwargs, path='/length', timeout=30)], timeout=0.3)
+        self.assertEqual(response.status, 200)
+        self.assertTrue(response.from_cache)
+        self.assertEqual(stale_body, body)
+
+class TestRunRequests(unittest.TestCase):
+    def test_empty(self) -> None:
+        self.assertEqual(request.run_requests([]), [])
+
+    def test_unreachable_host(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            # Nothing listens on port 9 (discard) here
+            (response, body, err), = request.run_requests([{'host': '127.0.0.1', 'port': 9, 'scheme': 'http', 'cache_dir': tmp, 'state_dir': tmp, 'timeout': 2, 'retries': 0}])
+            self.assertEqual(response.status, 503)
+            self.assertIsNone(body)
+            self.assertIsInstance(err, OSError)
+            with open(os.path.join(tmp, request.BREAKER_FILE)) as fh:
+                self.assertEqual(json.load(fh)['127.0.0.1']['failures'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
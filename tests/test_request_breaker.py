@@ -0,0 +1,132 @@
+# Tests for the circuit breaker and the last good fallback in swiftbar.request, against a local http.server that
+# can be made to hang. Run from the repository root with `python3 -m unittest discover tests` or pytest.
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from swiftbar import request, storage
+from unittest import mock
+import tempfile
+import threading
+import time
+import unittest
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.delay = 0
+        self.requests = 0
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self) -> None:
+        self.server.requests += 1
+        time.sleep(self.server.delay)
+        body = self.path.encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+class TestBreaker(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = Server()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.kwargs = {
+            'host': '127.0.0.1',
+            'port': self.server.server_address[1],
+            'scheme': 'http',
+            'cache_dir': self.tmp.name,
+            'state_dir': self.tmp.name,
+            'timeout': 0.2,
+            'retries': 2,
+        }
+        # No backoff between attempts
+        self.backoff = mock.patch.object(request, 'RETRY_BACKOFF', 0)
+        self.backoff.start()
+
+    def tearDown(self) -> None:
+        self.backoff.stop()
+        request.close_connections()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def breaker_state(self) -> dict:
+        return (storage.read_json(os.path.join(self.tmp.name, request.BREAKER_FILE)) or {}).get('127.0.0.1')
+
+    def test_every_failed_attempt_counts(self) -> None:
+        self.server.delay = 1
+        response, body, err = request.swiftbar_request(path='/hung', **self.kwargs)
+        self.assertEqual(response.status, 503)
+        self.assertIsInstance(err, OSError)
+        # One call with two retries is enough to open the circuit
+        self.assertEqual(self.breaker_state()['failures'], request.BREAKER_THRESHOLD)
+
+        start = time.monotonic()
+        requests = self.server.requests
+        response, body, err = request.swiftbar_request(path='/hung', **self.kwargs)
+        self.assertLess(time.monotonic() - start, 0.1)
+        self.assertEqual(response.status, 503)
+        self.assertEqual(self.server.requests, requests)
+
+    def test_retries_stop_when_the_circuit_opens(self) -> None:
+        self.server.delay = 1
+        request.swiftbar_request(path='/hung', **dict(self.kwargs, retries=10))
+        self.assertEqual(self.breaker_state()['failures'], request.BREAKER_THRESHOLD)
+
+    def test_success_resets_the_count(self) -> None:
+        self.server.delay = 1
+        request.swiftbar_request(path='/hung', **dict(self.kwargs, retries=0))
+        self.assertEqual(self.breaker_state()['failures'], 1)
+        self.server.delay = 0
+        request.swiftbar_request(path='/ok', **dict(self.kwargs, retries=0))
+        self.assertIsNone(self.breaker_state())
+
+    def test_last_good_gets_one_short_attempt(self) -> None:
+        response, body, err = request.swiftbar_request(path='/quote', **dict(self.kwargs, timeout=5))
+        self.assertEqual(body, '/quote')
+
+        self.server.delay = 1
+        requests = self.server.requests
+        start = time.monotonic()
+        with mock.patch.object(request, 'FALLBACK_TIMEOUT', 0.2):
+            response, stale_body, err = request.swiftbar_request(path='/quote', **dict(self.kwargs, timeout=5))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertTrue(response.from_cache)
+        self.assertEqual(stale_body, body)
+        self.assertEqual(self.server.requests, requests + 1)
+
+    def test_cache_key_finds_the_last_good_response(self) -> None:
+        response, body, err = request.swiftbar_request(path='/events', query={'start': 1}, cache_key='/events', **self.kwargs)
+        self.assertEqual(body, '/events?start=1')
+        self.server.delay = 1
+        with mock.patch.object(request, 'FALLBACK_TIMEOUT', 0.2):
+            response, stale_body, err = request.swiftbar_request(path='/events', query={'start': 2}, cache_key='/events', **self.kwargs)
+        self.assertTrue(response.from_cache)
+        self.assertEqual(stale_body, body)
+        self.assertEqual(len([name for name in os.listdir(self.tmp.name) if name.endswith(request.CACHE_SUFFIX)]), 1)
+
+    def test_cache_entries_are_private(self) -> None:
+        request.swiftbar_request(path='/private', **self.kwargs)
+        for name in os.listdir(self.tmp.name):
+            if name.endswith(request.CACHE_SUFFIX):
+                self.assertEqual(os.stat(os.path.join(self.tmp.name, name)).st_mode & 0o777, 0o600)
+
+    def test_async_attempts_count(self) -> None:
+        self.server.delay = 1
+        (response, body, err), = request.run_requests([dict(self.kwargs, path='/hung')])
+        self.assertEqual(response.status, 503)
+        self.assertEqual(self.breaker_state()['failures'], request.BREAKER_THRESHOLD)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+# Tests for the keep-alive connection pool in swiftbar.request, against a local http.server that counts the
+# connections it accepts. Run from the repository root with `python3 -m unittest discover tests` or pytest.
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from swiftbar import request
+import socket
+import tempfile
+import threading
+import unittest
+
+class CountingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.accepted = 0
+        self.requests = 0
+        self.close_after_response = False
+        self.open_sockets = []
+        self.lock = threading.Lock()
+
+    def get_request(self):
+        conn, address = super().get_request()
+        with self.lock:
+            self.accepted += 1
+            self.open_sockets.append(conn)
+        return conn, address
+
+    def drop_idle_connections(self) -> None:
+        """
+        Close every connection from the server side, the way a server drops idle keep-alive connections.
+        """
+        with self.lock:
+            sockets, self.open_sockets = self.open_sockets, []
+        for conn in sockets:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self) -> None:
+        with self.server.lock:
+            self.server.requests += 1
+        body = self.path.encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        if self.server.close_after_response:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = CountingServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.kwargs = {
+            'host': '127.0.0.1',
+            'port': self.server.server_address[1],
+            'scheme': 'http',
+            'cache_dir': self.tmp.name,
+            'state_dir': self.tmp.name,
+            'timeout': 5,
+            'retries': 0,
+        }
+
+    def tearDown(self) -> None:
+        request.close_connections()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_consecutive_requests_reuse_one_connection(self) -> None:
+        for i in range(5):
+            response, body, err = request.swiftbar_request(path=f'/item{i}', **self.kwargs)
+            self.assertIsNone(err)
+            self.assertEqual(response.status, 200)
+            self.assertEqual(body, f'/item{i}')
+        self.assertEqual(self.server.requests, 5)
+        self.assertEqual(self.server.accepted, 1)
+
+    def test_dropped_idle_connection_is_retried_on_a_new_one(self) -> None:
+        response, body, err = request.swiftbar_request(path='/first', **self.kwargs)
+        self.assertEqual(body, '/first')
+        self.server.drop_idle_connections()
+
+        # retries is 0, so only the stale connection retry can make this succeed
+        response, body, err = request.swiftbar_request(path='/second', **self.kwargs)
+        self.assertIsNone(err)
+        self.assertEqual(response.status, 200)
+        self.assertFalse(getattr(response, 'from_cache', False))
+        self.assertEqual(body, '/second')
+        self.assertEqual(self.server.accepted, 2)
+
+        # The new connection went back into the pool
+        request.swiftbar_request(path='/third', **self.kwargs)
+        self.assertEqual(self.server.accepted, 2)
+
+    def test_connection_close_responses_are_not_pooled(self) -> None:
+        self.server.close_after_response = True
+        for i in range(3):
+            response, body, err = request.swiftbar_request(path=f'/item{i}', **self.kwargs)
+            self.assertEqual(body, f'/item{i}')
+        self.assertEqual(self.server.accepted, 3)
+        self.assertFalse(request._pool.get(('http', '127.0.0.1', self.kwargs['port'])))
+
+    def test_idle_connections_are_bounded(self) -> None:
+        key = ('http', '127.0.0.1', self.kwargs['port'])
+        connections = [request._get_connection(key)[0] for _ in range(request.MAX_IDLE_CONNECTIONS + 2)]
+        for conn in connections:
+            request._release_connection(key, conn)
+        self.assertEqual(len(request._pool[key]), request.MAX_IDLE_CONNECTIONS)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+# Tests for the shell stubs written by swiftbar.runner, run with /bin/sh from directories whose names need quoting.
+# Run from the repository root with `python3 -m unittest discover tests` or pytest.
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from swiftbar import runner, storage
+import subprocess
+import tempfile
+import unittest
+
+PLUGIN = '''#!/bin/sh
+# <xbar.title>Quoted</xbar.title>
+echo "plugin $*"
+'''
+
+class TestStub(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def write_stub(self, name: str=None) -> str:
+        base = os.path.join(self.tmp.name, name)
+        plugin_dir, stub_dir, output_dir = [os.path.join(base, sub) for sub in ('plugins', 'stubs', 'output')]
+        for directory in (plugin_dir, stub_dir, output_dir):
+            os.makedirs(directory)
+        plugin_path = os.path.join(plugin_dir, 'quoted.2s.sh')
+        storage.write_text(plugin_path, PLUGIN)
+        os.chmod(plugin_path, 0o755)
+        self.plugin = runner.HostedPlugin(plugin_path, 2, None, runner.get_output_file(plugin_path, output_dir))
+        self.output_dir = output_dir
+        return runner.write_stub(self.plugin, stub_dir, output_dir)
+
+    def run_stub(self, stub_path: str=None, *args) -> str:
+        return subprocess.run([stub_path, *args], capture_output=True, text=True, check=True).stdout
+
+    def test_quoted_paths(self) -> None:
+        for name in ["it's here", 'space and $HOME', 'back`tick`"quote"']:
+            with self.subTest(name=name):
+                stub_path = self.write_stub(name)
+                # No runner is alive, so the stub runs the plugin
+                self.assertEqual(self.run_stub(stub_path, 'a b'), 'plugin a b\n')
+                # With the runner alive, the stub prints its output
+                storage.write_text(self.plugin.output_file, 'from runner\n')
+                storage.write_text(runner.get_pid_file(self.output_dir), f'{os.getpid()}\n')
+                self.assertEqual(self.run_stub(stub_path), 'from runner\n')
+
+if __name__ == '__main__':
+    unittest.main()
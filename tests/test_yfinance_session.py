@@ -0,0 +1,76 @@
+# Tests for the Yahoo! Finance cookie and crumb refresh in swiftbar.yfinance, with the network fetch stubbed out.
+# Run from the repository root with `python3 -m unittest discover tests` or pytest.
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from swiftbar import storage, yfinance
+from unittest import mock
+import tempfile
+import threading
+import time
+import unittest
+
+class TestRefreshSession(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.fetches = 0
+        self.fetch_lock = threading.Lock()
+        self.session = mock.patch.dict(yfinance._session, {'cache_dir': self.tmp.name, 'cookie': 'c0', 'crumb': 'stale'})
+        self.session.start()
+        yfinance._session.pop('refreshed_from', None)
+        storage.write_json(os.path.join(self.tmp.name, yfinance.SESSION_FILE), {'timestamp': time.time(), 'cookie': 'c0', 'crumb': 'stale'})
+
+    def tearDown(self) -> None:
+        self.session.stop()
+        self.tmp.cleanup()
+
+    def fetch(self, succeed: bool=True):
+        def fetch_cookie_and_crumb():
+            with self.fetch_lock:
+                self.fetches += 1
+                fetch = self.fetches
+            # Give the other threads time to pile up behind the refresh
+            time.sleep(0.05)
+            return (f'c{fetch}', f'fresh{fetch}') if succeed else (None, None)
+        return mock.patch.object(yfinance, '_fetch_cookie_and_crumb', fetch_cookie_and_crumb)
+
+    def refresh_concurrently(self, threads: int=8) -> list:
+        results = [None] * threads
+        def refresh(i: int) -> None:
+            results[i] = yfinance._refresh_session('stale')
+        workers = [threading.Thread(target=refresh, args=(i,)) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return results
+
+    def test_threads_share_one_refresh(self) -> None:
+        with self.fetch():
+            results = self.refresh_concurrently()
+        self.assertEqual(self.fetches, 1)
+        self.assertEqual(set(results), {('c1', 'fresh1')})
+        self.assertEqual(storage.read_json(os.path.join(self.tmp.name, yfinance.SESSION_FILE))['crumb'], 'fresh1')
+
+    def test_failed_refresh_is_not_repeated(self) -> None:
+        with self.fetch(succeed=False):
+            results = self.refresh_concurrently()
+        self.assertEqual(self.fetches, 1)
+        self.assertEqual(set(results), {(None, None)})
+
+    def test_refresh_by_another_process_is_reused(self) -> None:
+        # Another plugin already replaced the rejected crumb in the session file
+        storage.write_json(os.path.join(self.tmp.name, yfinance.SESSION_FILE), {'timestamp': time.time(), 'cookie': 'c9', 'crumb': 'other'})
+        with self.fetch():
+            self.assertEqual(yfinance._refresh_session('stale'), ('c9', 'other'))
+        self.assertEqual(self.fetches, 0)
+
+    def test_session_file_is_private(self) -> None:
+        with self.fetch():
+            yfinance._refresh_session('stale')
+        self.assertEqual(os.stat(os.path.join(self.tmp.name, yfinance.SESSION_FILE)).st_mode & 0o777, 0o600)
+
+if __name__ == '__main__':
+    unittest.main()
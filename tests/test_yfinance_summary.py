@@ -0,0 +1,32 @@
+# Tests for merging the quote summary modules in swiftbar.yfinance, with the module requests stubbed out.
+# Run from the repository root with `python3 -m unittest discover tests` or pytest.
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from swiftbar import yfinance
+from unittest import mock
+import unittest
+
+class TestQuoteSummary(unittest.TestCase):
+    def summary(self, dynamic: dict=None, static: dict=None):
+        def get_modules(modules: list=None, cache_ttl: float=None, **kwargs):
+            return static if cache_ttl else dynamic
+        with mock.patch.object(yfinance, '_get_quote_summary_modules', get_modules):
+            return yfinance.get_quote_summary(symbol='AAPL', modules=['financialData'], static_modules=['assetProfile'])
+
+    def test_both_succeed(self) -> None:
+        self.assertEqual(self.summary({'open': 1}, {'website': 'w'}), {'open': 1, 'website': 'w'})
+
+    def test_static_failure_keeps_the_dynamic_data(self) -> None:
+        self.assertEqual(self.summary({'open': 1}, None), {'open': 1})
+
+    def test_dynamic_failure_keeps_the_static_data(self) -> None:
+        self.assertEqual(self.summary(None, {'website': 'w'}), {'website': 'w'})
+
+    def test_both_fail(self) -> None:
+        self.assertIsNone(self.summary(None, None))
+
+if __name__ == '__main__':
+    unittest.main()